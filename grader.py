@@ -1,20 +1,52 @@
 import argparse
+import atexit
+import copy
+import gc
+import hashlib
+import importlib.util
+import io
 import json
+import locale
+import math
+import mmap
 import os
 import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
 import traceback
-import venv
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Protocol, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+# asyncio、concurrent.futures、venv、tomllib 和 rich 的导入开销较大，只在真正用到
+# 时才导入，这样 --json 和 -l 等不需要终端渲染的调用可以更快启动
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from rich.console import Console
+    from rich.progress import Progress
 
 
 def create_venv(venv_path):
+    import venv
+
     if venv_path.exists():
         shutil.rmtree(venv_path)
     print("Creating virtual environment...", flush=True)
@@ -39,15 +71,28 @@ def install_requirements(venv_path):
     )
 
 
-def ensure_venv():
-    # 首先检查本地是否已安装必需的包
-    try:
-        import rich
-        import tomli
+def required_packages(argv: List[str]) -> List[str]:
+    """本次调用需要的第三方包
+
+    Python 3.11 起标准库自带 tomllib，不再需要 tomli；--json、-l 和 merge 子命令
+    不渲染终端界面，不需要 rich。
+    """
+    packages = [] if sys.version_info >= (3, 11) else ["tomli"]
+    if argv[:1] != ["merge"] and not any(
+        arg in ("-j", "--json", "-l", "--get-last-failed", "--self-bench")
+        for arg in argv
+    ):
+        packages.append("rich")
+    return packages
 
+
+def ensure_venv():
+    # 首先检查本地是否已安装本次调用需要的包（只查找，不导入）
+    if all(
+        importlib.util.find_spec(package) is not None
+        for package in required_packages(sys.argv[1:])
+    ):
         return True
-    except ImportError:
-        pass
 
     venv_dir = Path(__file__).parent / ".venv"
     python_path = (
@@ -100,11 +145,42 @@ if __name__ == "__main__":
         sys.exit(0)
 
 
-import tomli  # noqa: E402
-from rich.console import Console  # noqa: E402
-from rich.panel import Panel  # noqa: E402
-from rich.progress import Progress, SpinnerColumn, TextColumn  # noqa: E402
-from rich.table import Table  # noqa: E402
+def load_toml(f: BinaryIO) -> Dict[str, Any]:
+    """解析 TOML 文件，优先使用标准库 tomllib（Python 3.11+），只在需要时导入"""
+    try:
+        import tomllib
+    except ModuleNotFoundError:
+        import tomli as tomllib
+
+    return tomllib.load(f)
+
+
+class QuietConsole:
+    """--json 模式使用的静默控制台
+
+    与 rich 的 Console(quiet=True) 一样丢弃所有输出，但不需要导入 rich。它的布尔值
+    为假，因此 TestRunner 和 setup 步骤会走不使用 rich 进度条的分支。
+    """
+
+    quiet = True
+
+    def __bool__(self) -> bool:
+        return False
+
+    def print(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def clear(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+def create_console(quiet: bool = False, **kwargs: Any) -> "Console":
+    """创建控制台，quiet 为真时返回 QuietConsole，此时不会导入 rich"""
+    if quiet:
+        return QuietConsole()
+    from rich.console import Console
+
+    return Console(**kwargs)
 
 
 @dataclass
@@ -116,6 +192,8 @@ class TestResult:
     max_score: float
     step_scores: List[Tuple[str, float, float]] = None
     error_details: Optional[List[Dict[str, Any]]] = None
+    # 每个步骤的资源使用情况（CPU 时间、最大常驻内存、缺页、上下文切换）
+    step_usage: Optional[List[Dict[str, Any]]] = None
 
     @property
     def status(self) -> str:
@@ -135,6 +213,7 @@ class TestResult:
             "max_score": self.max_score,
             "step_scores": self.step_scores,
             "error_details": self.error_details,
+            "step_usage": self.step_usage,
         }
 
 
@@ -145,6 +224,16 @@ class TestCase:
     run_steps: List[Dict[str, Any]]
 
 
+def matches_test_id(test: TestCase, test_id: str) -> bool:
+    """测试点是否与 [groups] 等处的测试编号匹配（与 --group 相同：纯数字按目录名的
+    数字前缀精确匹配，否则按目录名开头匹配）"""
+    test_id = str(test_id)
+    if test_id.isdigit():
+        match = re.match(r"(\d+)", test.path.name)
+        return match is not None and match.group(1) == test_id
+    return test.path.name.lower().startswith(test_id.lower())
+
+
 class Config:
     def __init__(self, project_root: Path):
         self.project_root = project_root
@@ -164,7 +253,7 @@ class Config:
                 },
             }
         with open(config_path, "rb") as f:
-            return tomli.load(f)
+            return load_toml(f)
 
     @property
     def paths(self) -> Dict[str, Path]:
@@ -174,15 +263,111 @@ class Config:
             "common_dir": self.project_root / self._config["paths"]["common_dir"],
         }
 
+    @property
+    def grader_settings(self) -> Dict[str, Any]:
+        """评分器的全局配置（[grader] 部分）"""
+        return self._config.get("grader", {})
+
     @property
     def setup_steps(self) -> List[Dict[str, Any]]:
         return self._config.get("setup", {}).get("steps", [])
 
+    @property
+    def cache_config(self) -> Dict[str, Any]:
+        """步骤缓存配置（--cache 启用）"""
+        cache_config = {
+            "dir": ".grader_cache",
+            "max_size_mb": 256,
+            "commands": ["${root_dir}/cc"],
+        }
+        cache_config.update(self._config.get("cache", {}))
+        return cache_config
+
+    @property
+    def fingerprint_config(self) -> Dict[str, Any]:
+        """--changed 模式下计算测试点指纹所用的工具源文件配置"""
+        fingerprint_config = {"shared": [], "tools": {}}
+        fingerprint_config.update(self._config.get("fingerprint", {}))
+        return fingerprint_config
+
     @property
     def groups(self) -> Dict[str, List[str]]:
         """获取测试组配置"""
         return self._config.get("groups", {})
 
+    @property
+    def bench_config(self) -> Dict[str, Any]:
+        """--self-bench 和 --bench-linker 的配置（[bench] 部分）"""
+        bench_config = {
+            "startup_budget_ms": 180.0,
+            "runs": 20,
+            "cases": 1000,
+            "steps": 20,
+            "dispatch_steps": 500,
+            "linker_sizes": [10, 100, 1000, 10000],
+            "linker_runs": 5,
+        }
+        bench_config.update(self._config.get("bench", {}))
+        return bench_config
+
+    @property
+    def generate_config(self) -> Dict[str, Any]:
+        """grader.py generate 的默认参数（[generate] 部分）"""
+        generate_config = {"units": 16, "symbols": 400, "score": 10}
+        generate_config.update(self._config.get("generate", {}))
+        return generate_config
+
+    @property
+    def fuzz_config(self) -> Dict[str, Any]:
+        """grader.py fuzz 的配置（[fuzz] 部分）"""
+        fuzz_config = {
+            "dir": "tests/fuzz",
+            "max_units": 4,
+            "max_symbols": 80,
+            "max_failures": 1,
+        }
+        fuzz_config.update(self._config.get("fuzz", {}))
+        return fuzz_config
+
+    @property
+    def history_config(self) -> Dict[str, Any]:
+        """测试历史记录的配置（[history] 部分）"""
+        history_config = {"retention": 10}
+        history_config.update(self._config.get("history", {}))
+        return history_config
+
+    @property
+    def stats_config(self) -> Dict[str, Any]:
+        """grader.py stats 的默认参数（[stats] 部分）"""
+        stats_config = {"window": 5, "threshold": 1.5, "min_delta_ms": 50.0}
+        stats_config.update(self._config.get("stats", {}))
+        return stats_config
+
+    @property
+    def baseline_config(self) -> Dict[str, Any]:
+        """grader.py baseline 的配置（[baseline] 部分）"""
+        baseline_config = {
+            "dir": ".grader_baselines",
+            "tools": ["ld", "nm", "exec"],
+            "repeat": 20,
+            "alpha": 0.001,
+            "min_ratio": 1.5,
+            "min_delta_ms": 5.0,
+        }
+        baseline_config.update(self._config.get("baseline", {}))
+        return baseline_config
+
+    @property
+    def watch_config(self) -> Dict[str, Any]:
+        """--watch 监视的路径和扫描间隔（[watch] 部分）"""
+        watch_config = {
+            "paths": ["src", "include", "tests", "Makefile"],
+            "ignore": ["build", "*.o", "*.fle", ".*", "__pycache__"],
+            "interval": 0.5,
+        }
+        watch_config.update(self._config.get("watch", {}))
+        return watch_config
+
     @property
     def debug_config(self) -> Dict[str, Any]:
         """Get debug configuration from config file"""
@@ -194,6 +379,380 @@ class Config:
         )
 
 
+# 单个步骤的 stdout/stderr 默认最多在内存中保留的字节数
+DEFAULT_MAX_OUTPUT = 4 * 1024 * 1024
+
+
+def decode_output(data: bytes) -> str:
+    """与 subprocess 的 text=True 一致：使用本地编码解码并统一换行符"""
+    text = data.decode(locale.getpreferredencoding(False), errors="replace")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class CapturedOutput(str):
+    """步骤的标准输出或标准错误
+
+    超过 max_output 时，字符串本身只包含开头和结尾的预览，完整内容保存在
+    spill_path 指向的文件中，需要完整内容的检查器可以通过 open_full() 流式读取。
+    """
+
+    spill_path: Optional[Path] = None
+    total_bytes: int = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.spill_path is not None
+
+    def open_full(self) -> TextIO:
+        if self.spill_path is None:
+            return io.StringIO(str(self))
+        return open(
+            self.spill_path,
+            encoding=locale.getpreferredencoding(False),
+            errors="replace",
+        )
+
+
+class OutputCapture:
+    """增量收集子进程的输出，超过上限后把完整内容写入文件，内存中只保留首尾"""
+
+    def __init__(self, limit: int, spill_path: Path):
+        self.limit = limit
+        # 首尾各保留的字节数；至少为 1，否则 limit 为 1 时切片 [-0:] 会保留全部内容
+        self.half = max(1, limit // 2)
+        self.spill_path = spill_path
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._file = None
+        self._head = b""
+        self._tail = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+        if self._file is None:
+            self._chunks.append(chunk)
+            if self.limit and self._size > self.limit:
+                data = b"".join(self._chunks)
+                self._chunks = []
+                self._file = open(self.spill_path, "wb")
+                self._file.write(data)
+                self._head = data[: self.half]
+                self._tail = bytearray(data[-self.half :])
+            return
+
+        self._file.write(chunk)
+        self._tail += chunk
+        del self._tail[: -self.half]
+
+    def finish(self) -> CapturedOutput:
+        if self._file is None:
+            output = CapturedOutput(decode_output(b"".join(self._chunks)))
+            output.total_bytes = self._size
+            return output
+        self._file.close()
+        return self._preview(self.spill_path, self._head, bytes(self._tail), self._size)
+
+    @classmethod
+    def from_file(cls, path: Path, limit: int) -> CapturedOutput:
+        """读取已经写入文件的输出，未超过上限时删除文件并返回完整内容"""
+        size = path.stat().st_size
+        with open(path, "rb") as f:
+            if not limit or size <= limit:
+                data = f.read()
+            else:
+                half = max(1, limit // 2)
+                head = f.read(half)
+                f.seek(size - half)
+                return cls._preview(path, head, f.read(), size)
+        path.unlink()
+        output = CapturedOutput(decode_output(data))
+        output.total_bytes = size
+        return output
+
+    @staticmethod
+    def _preview(path: Path, head: bytes, tail: bytes, size: int) -> CapturedOutput:
+        omitted = size - len(head) - len(tail)
+        output = CapturedOutput(
+            decode_output(head)
+            + f"\n... [{omitted} bytes omitted, full output in {path}] ...\n"
+            + decode_output(tail)
+        )
+        output.spill_path = path
+        output.total_bytes = size
+        return output
+
+
+def own_peak_rss_kb() -> Optional[int]:
+    """评分器进程自身的峰值常驻内存（/proc/self/status 中的 VmHWM），不支持时返回 None"""
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+# 测量资源使用情况的启动器：fork 出子进程运行目标程序，用 wait4 回收后把目标程序
+# 自身的资源使用情况写入 REPORT_FD，并以与目标程序相同的方式退出。启动器本身很小，
+# 目标程序的 ru_maxrss 因此不会混入评分器的峰值内存（见 RusagePopen）。
+# 协议：exec 成功后写入 "started"，失败时写入 "error <errno>"；目标程序退出后写入
+# "maxrss utime stime minflt majflt nvcsw nivcsw"。
+_RUSAGE_LAUNCHER_SOURCE = r"""
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static pid_t child;
+
+static void forward(int sig) { kill(child, sig); }
+
+int main(int argc, char **argv) {
+    int errpipe[2], err, status, null;
+    pid_t parent = getpid();
+    struct rusage ru;
+    struct rlimit no_core = {0, 0};
+    sigset_t set;
+    FILE *report;
+
+    if (argc < 3 || pipe2(errpipe, O_CLOEXEC) != 0)
+        return 127;
+    report = fdopen(atoi(argv[1]), "w");
+    if (report == NULL)
+        return 127;
+    fcntl(fileno(report), F_SETFD, FD_CLOEXEC);
+    child = fork();
+    if (child < 0)
+        return 127;
+    if (child == 0) {
+        /* 启动器被杀死（例如超时）时目标程序也随之退出 */
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (getppid() != parent)
+            _exit(127);
+        execvp(argv[2], argv + 2);
+        err = errno;
+        write(errpipe[1], &err, sizeof err);
+        _exit(127);
+    }
+    close(errpipe[1]);
+    /* 不占用目标程序的标准输入输出管道 */
+    null = open("/dev/null", O_RDWR);
+    dup2(null, 0);
+    dup2(null, 1);
+    dup2(null, 2);
+    signal(SIGTERM, forward);
+    signal(SIGHUP, forward);
+    signal(SIGINT, SIG_IGN);
+    signal(SIGQUIT, SIG_IGN);
+    if (read(errpipe[0], &err, sizeof err) == sizeof err) {
+        fprintf(report, "error %d\n", err);
+        return 127;
+    }
+    fputs("started\n", report);
+    fflush(report);
+    while (wait4(child, &status, 0, &ru) < 0)
+        if (errno != EINTR)
+            return 127;
+    fprintf(report, "%ld %ld.%06ld %ld.%06ld %ld %ld %ld %ld\n", ru.ru_maxrss,
+            (long)ru.ru_utime.tv_sec, (long)ru.ru_utime.tv_usec,
+            (long)ru.ru_stime.tv_sec, (long)ru.ru_stime.tv_usec, ru.ru_minflt,
+            ru.ru_majflt, ru.ru_nvcsw, ru.ru_nivcsw);
+    fclose(report);
+    if (WIFSIGNALED(status)) {
+        setrlimit(RLIMIT_CORE, &no_core);
+        signal(WTERMSIG(status), SIG_DFL);
+        sigemptyset(&set);
+        sigaddset(&set, WTERMSIG(status));
+        sigprocmask(SIG_UNBLOCK, &set, NULL);
+        raise(WTERMSIG(status));
+    }
+    return WIFEXITED(status) ? WEXITSTATUS(status) : 127;
+}
+"""
+
+
+class RusagePopen(subprocess.Popen):
+    """回收时记录子进程资源使用情况的 Popen
+
+    Linux 在 exec 时把原地址空间（vfork 时就是评分器自己的地址空间）的峰值内存
+    计入子进程的 ru_maxrss，因此直接启动的子进程的 ru_maxrss 至少是评分器自身的
+    峰值，小工具的内存用量完全被掩盖。为此在 Linux 上通过一个很小的启动器
+    （_RUSAGE_LAUNCHER_SOURCE，首次使用时编译到 launcher_dir）启动目标程序：
+    启动器 fork 出的子进程只继承启动器自身不到 1 MiB 的峰值，回收后由启动器
+    报告目标程序的资源使用情况。pid、kill() 和 returncode 对应启动器，启动器在
+    被杀死时会带走目标程序，并以与目标程序相同的方式退出。
+
+    无法使用启动器时（非 Linux、没有 C 编译器、shell=True）直接启动子进程，
+    通过 os.wait4 回收并记录资源使用情况；此时 ru_maxrss 不超过评分器自身的峰值
+    就无法与继承的部分区分，max_rss_kb 报告为 None。注意 poll() 不经过
+    _try_wait，需要资源使用情况时应调用 wait()。
+    """
+
+    rusage = None
+    # 回收子进程时评分器自身的峰值常驻内存（KiB）
+    inherited_rss_kb = None
+    # 编译后的启动器所在目录（Grader 设置为 [cache].dir），为 None 时不使用启动器
+    launcher_dir: Optional[Path] = None
+    _launcher: Optional[str] = None
+    _launcher_checked = False
+    _launcher_lock = threading.Lock()
+
+    def __init__(self, args: Any, **kwargs: Any):
+        self._report: Optional[BinaryIO] = None
+        self._launcher_usage: Optional[Dict[str, Any]] = None
+        launcher = None
+        if not kwargs.get("shell") and not isinstance(args, (str, bytes)):
+            launcher = self.launcher()
+        if launcher is None:
+            super().__init__(args, **kwargs)
+            return
+
+        read_fd, write_fd = os.pipe()
+        kwargs["pass_fds"] = tuple(kwargs.get("pass_fds", ())) + (write_fd,)
+        try:
+            super().__init__([launcher, str(write_fd), *args], **kwargs)
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self.args = args
+        self._report = os.fdopen(read_fd, "rb")
+        # 与 Popen 一样，目标程序无法执行时在这里抛出 OSError
+        status = self._report.readline().split()
+        if status[:1] == [b"error"]:
+            self.wait()
+            self._report.close()
+            code = int(status[1])
+            raise OSError(code, os.strerror(code), os.fspath(args[0]))
+
+    @classmethod
+    def launcher(cls) -> Optional[str]:
+        """编译好的启动器的路径，首次调用时按需编译；不能使用启动器时返回 None"""
+        with cls._launcher_lock:
+            if not cls._launcher_checked:
+                cls._launcher_checked = True
+                cls._launcher = cls._build_launcher()
+            return cls._launcher
+
+    @classmethod
+    def _build_launcher(cls) -> Optional[str]:
+        if cls.launcher_dir is None or not sys.platform.startswith("linux"):
+            return None
+        digest = hashlib.sha256(_RUSAGE_LAUNCHER_SOURCE.encode()).hexdigest()[:16]
+        path = cls.launcher_dir / f"rusage-launcher-{digest}"
+        if os.access(path, os.X_OK):
+            return str(path)
+        compiler = shutil.which("gcc") or shutil.which("cc")
+        if compiler is None:
+            return None
+        # 多个评分器可能同时编译，先写入临时文件再原子地改名
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            cls.launcher_dir.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                [compiler, "-O2", "-x", "c", "-", "-o", str(temp)],
+                input=_RUSAGE_LAUNCHER_SOURCE,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            os.replace(temp, path)
+        except (OSError, subprocess.CalledProcessError):
+            temp.unlink(missing_ok=True)
+            return None
+        return str(path)
+
+    def _try_wait(self, wait_flags):
+        if not hasattr(os, "wait4"):
+            return super()._try_wait(wait_flags)
+        try:
+            pid, sts, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # 与 Popen._try_wait 一致：子进程已被回收，无法取得退出状态
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+            self.inherited_rss_kb = own_peak_rss_kb()
+        return pid, sts
+
+    def usage(self) -> Optional[Dict[str, Any]]:
+        """子进程的 CPU 时间、最大常驻内存、缺页和上下文切换次数
+
+        不使用启动器时，max_rss_kb 无法与继承自评分器的峰值区分时为 None
+        （见类的说明）。启动器被杀死（例如超时）时返回 None。
+        """
+        if self._report is not None:
+            return self._read_report()
+        if self.rusage is None:
+            return None
+        ru = self.rusage
+        # Linux 上 ru_maxrss 的单位是 KiB，macOS 上是字节
+        max_rss_kb = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss
+        if self.inherited_rss_kb is not None and max_rss_kb <= self.inherited_rss_kb:
+            max_rss_kb = None
+        return {
+            "user_time": round(ru.ru_utime, 4),
+            "system_time": round(ru.ru_stime, 4),
+            "max_rss_kb": max_rss_kb,
+            "minor_faults": ru.ru_minflt,
+            "major_faults": ru.ru_majflt,
+            "voluntary_switches": ru.ru_nvcsw,
+            "involuntary_switches": ru.ru_nivcsw,
+        }
+
+    def _read_report(self) -> Optional[Dict[str, Any]]:
+        """读取启动器报告的目标程序资源使用情况，需要在启动器退出后调用"""
+        if not self._report.closed:
+            fields = self._report.readline().split()
+            self._report.close()
+            if len(fields) == 7:
+                self._launcher_usage = {
+                    "user_time": round(float(fields[1]), 4),
+                    "system_time": round(float(fields[2]), 4),
+                    "max_rss_kb": int(fields[0]),
+                    "minor_faults": int(fields[3]),
+                    "major_faults": int(fields[4]),
+                    "voluntary_switches": int(fields[5]),
+                    "involuntary_switches": int(fields[6]),
+                }
+        return self._launcher_usage
+
+
+def run_process(
+    args: List[str],
+    input: Optional[str] = None,
+    timeout: Optional[float] = None,
+    **kwargs: Any,
+) -> subprocess.CompletedProcess:
+    """与 subprocess.run 相同，但返回值额外带有 rusage 属性（见 RusagePopen.usage）"""
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    with RusagePopen(args, **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise
+        except BaseException:
+            process.kill()
+            raise
+    completed = subprocess.CompletedProcess(
+        process.args, process.returncode, stdout, stderr
+    )
+    completed.rusage = process.usage()
+    return completed
+
+
 class OutputChecker(Protocol):
     def check(
         self,
@@ -206,6 +765,168 @@ class OutputChecker(Protocol):
         pass
 
 
+@dataclass
+class OutputMismatch:
+    """实际输出与期望输出的第一处差异，行列号从 1 开始，指向实际输出中的位置"""
+
+    line: int
+    column: int
+    expected: str
+    actual: str
+
+    def describe(self) -> str:
+        return (
+            f"(first difference at line {self.line}, column {self.column}: "
+            f"expected {self.expected}, got {self.actual})"
+        )
+
+
+class StreamingComparator:
+    """按块比较期望输出和实际输出，遇到第一处差异立即停止
+
+    语义与整体比较一致：默认忽略末尾空白，ignore_whitespace 时按空白分隔的
+    单词序列比较。两边都只按块读取，内存占用与输出大小无关。
+    """
+
+    SNIPPET_LENGTH = 20
+
+    def __init__(self, chunk_size: int = 1 << 16):
+        self.chunk_size = chunk_size
+
+    def compare(
+        self, expected: TextIO, actual: TextIO, ignore_whitespace: bool = False
+    ) -> Optional[OutputMismatch]:
+        if ignore_whitespace:
+            return self._compare_tokens(expected, actual)
+        return self._compare_text(expected, actual)
+
+    def _compare_text(
+        self, expected: TextIO, actual: TextIO
+    ) -> Optional[OutputMismatch]:
+        line, column = 1, 1
+        expected_buf, actual_buf = "", ""
+        while True:
+            if not expected_buf:
+                expected_buf = expected.read(self.chunk_size)
+            if not actual_buf:
+                actual_buf = actual.read(self.chunk_size)
+            if not expected_buf or not actual_buf:
+                break
+
+            length = min(len(expected_buf), len(actual_buf))
+            if expected_buf[:length] == actual_buf[:length]:
+                line, column = self._advance(line, column, actual_buf[:length])
+                expected_buf = expected_buf[length:]
+                actual_buf = actual_buf[length:]
+                continue
+
+            index = next(i for i in range(length) if expected_buf[i] != actual_buf[i])
+            line, column = self._advance(line, column, actual_buf[:index])
+            expected_buf = expected_buf[index:]
+            actual_buf = actual_buf[index:]
+            # 两边都是空白时，只有两边剩余部分都只剩空白才算相同（忽略末尾空白）
+            if (
+                expected_buf[0].isspace()
+                and actual_buf[0].isspace()
+                and self._rest_is_space(expected_buf, expected)
+                and self._rest_is_space(actual_buf, actual)
+            ):
+                return None
+            return OutputMismatch(
+                line,
+                column,
+                self._snippet(expected_buf),
+                self._snippet(actual_buf),
+            )
+
+        # 一边已经结束，另一边剩下的只能是空白
+        if expected_buf and not self._rest_is_space(expected_buf, expected):
+            return OutputMismatch(
+                line, column, self._snippet(expected_buf), "end of output"
+            )
+        if actual_buf and not self._rest_is_space(actual_buf, actual):
+            return OutputMismatch(
+                line, column, "end of output", self._snippet(actual_buf)
+            )
+        return None
+
+    def _compare_tokens(
+        self, expected: TextIO, actual: TextIO
+    ) -> Optional[OutputMismatch]:
+        expected_segments = self._segments(expected)
+        expected_tokens: List[str] = []
+        expected_pos = 0
+        line, column = 1, 1
+        for segment in self._segments(actual):
+            tokens = segment.split()
+            # 从期望输出中取出同样数量的单词进行比较
+            while len(expected_tokens) - expected_pos < len(tokens):
+                next_segment = next(expected_segments, None)
+                if next_segment is None:
+                    break
+                expected_tokens = expected_tokens[expected_pos:] + next_segment.split()
+                expected_pos = 0
+            batch = expected_tokens[expected_pos : expected_pos + len(tokens)]
+            if batch == tokens:
+                expected_pos += len(tokens)
+                line, column = self._advance(line, column, segment)
+                continue
+
+            # 只有出现差异时才计算单词的位置
+            for index, match in enumerate(re.finditer(r"\S+", segment)):
+                if index >= len(batch) or batch[index] != match.group():
+                    line, column = self._advance(line, column, segment[: match.start()])
+                    return OutputMismatch(
+                        line,
+                        column,
+                        repr(batch[index]) if index < len(batch) else "end of output",
+                        repr(match.group()),
+                    )
+
+        if expected_pos < len(expected_tokens):
+            return OutputMismatch(
+                line, column, repr(expected_tokens[expected_pos]), "end of output"
+            )
+        for segment in expected_segments:
+            tokens = segment.split()
+            if tokens:
+                return OutputMismatch(line, column, repr(tokens[0]), "end of output")
+        return None
+
+    def _segments(self, stream: TextIO) -> Iterator[str]:
+        """逐块产出文本，保证单词不会被切分到两个块中"""
+        pending = ""
+        for chunk in iter(lambda: stream.read(self.chunk_size), ""):
+            text = pending + chunk
+            # 最后一个单词可能延续到下一块，留到下一次再处理
+            cut = len(text)
+            while cut and not text[cut - 1].isspace():
+                cut -= 1
+            pending = text[cut:]
+            if cut:
+                yield text[:cut]
+        if pending:
+            yield pending
+
+    def _rest_is_space(self, buf: str, stream: TextIO) -> bool:
+        if buf.strip():
+            return False
+        for chunk in iter(lambda: stream.read(self.chunk_size), ""):
+            if chunk.strip():
+                return False
+        return True
+
+    def _snippet(self, buf: str) -> str:
+        return repr(buf[: self.SNIPPET_LENGTH].split("\n")[0] or buf[:1])
+
+    @staticmethod
+    def _advance(line: int, column: int, text: str) -> Tuple[int, int]:
+        newlines = text.count("\n")
+        if newlines:
+            return line + newlines, len(text) - text.rfind("\n")
+        return line, column + len(text)
+
+
 class StandardOutputChecker:
     def check(
         self,
@@ -232,34 +953,101 @@ class StandardOutputChecker:
                 if not resolved_path.exists():
                     return False, f"Required file '{file_path}' not found", None
 
+        # 检查构建产物内容
+        for artifact in check.get("artifacts", []):
+            message = self._check_artifact(artifact, test_dir)
+            if message is not None:
+                return False, message, None
+
         # 检查标准输出
         if "stdout" in check:
             expect_file = test_dir / check["stdout"]
             if not expect_file.exists():
                 return False, f"Expected output file {check['stdout']} not found", None
-            with open(expect_file) as f:
-                expected = f.read()
-            if check.get("ignore_whitespace", False):
-                output = " ".join(output.split())
-                expected = " ".join(expected.split())
-            if output.rstrip() != expected.rstrip():
-                return False, "Output does not match expected content", None
+            mismatch = self._compare(expect_file, output, check)
+            if mismatch is not None:
+                return (
+                    False,
+                    f"Output does not match expected content {mismatch.describe()}",
+                    None,
+                )
 
         # 检查标准错误
         if "stderr" in check:
             expect_file = test_dir / check["stderr"]
             if not expect_file.exists():
                 return False, f"Expected error file {check['stderr']} not found", None
-            with open(expect_file) as f:
-                expected = f.read()
-            if check.get("ignore_whitespace", False):
-                error = " ".join(error.split())
-                expected = " ".join(expected.split())
-            if error.rstrip() != expected.rstrip():
-                return False, "Error output does not match expected content", None
+            mismatch = self._compare(expect_file, error, check)
+            if mismatch is not None:
+                return (
+                    False,
+                    f"Error output does not match expected content {mismatch.describe()}",
+                    None,
+                )
 
         return True, "All checks passed", None
 
+    @staticmethod
+    def _compare(
+        expect_file: Path, actual: str, check: Dict[str, Any]
+    ) -> Optional["OutputMismatch"]:
+        if isinstance(actual, CapturedOutput):
+            actual_stream = actual.open_full()
+        else:
+            actual_stream = io.StringIO(actual)
+        with open(expect_file) as expected_stream, actual_stream:
+            return StreamingComparator().compare(
+                expected_stream,
+                actual_stream,
+                ignore_whitespace=check.get("ignore_whitespace", False),
+            )
+
+    def _check_artifact(
+        self, artifact: Dict[str, Any], test_dir: Path
+    ) -> Optional[str]:
+        """将构建产物与标准文件（expected）或记录的摘要（sha256）比较，返回错误信息
+
+        mode = "bytes" 逐字节比较；mode = "fle" 比较 FLE 文件的规范化 JSON，
+        忽略键顺序和格式差异。
+        """
+        name = artifact["file"]
+        path = Path(self._resolve_path(name, test_dir))
+        if not path.exists():
+            return f"Required file '{name}' not found"
+        mode = artifact.get("mode", "bytes")
+        if mode not in DIGEST_MODES:
+            return f"Unknown artifact mode {mode!r} for '{name}'"
+
+        try:
+            if "sha256" in artifact:
+                expected = str(artifact["sha256"]).lower()
+                source = "recorded digest"
+            elif "expected" in artifact:
+                expect_file = test_dir / self._resolve_path(
+                    artifact["expected"], test_dir
+                )
+                if not expect_file.exists():
+                    return f"Expected artifact {artifact['expected']} not found"
+                if (
+                    mode == "bytes"
+                    and expect_file.stat().st_size != path.stat().st_size
+                ):
+                    return (
+                        f"Artifact '{name}' does not match "
+                        f"{artifact['expected']} (size differs)"
+                    )
+                expected = file_digest(expect_file, mode)
+                source = artifact["expected"]
+            else:
+                return f"Artifact check for '{name}' needs 'expected' or 'sha256'"
+            actual = file_digest(path, mode)
+        except ValueError as e:
+            return str(e)
+
+        if actual != expected:
+            return f"Artifact '{name}' does not match {source} ({mode} sha256 {actual})"
+        return None
+
     def _resolve_path(self, path: str, test_dir: Path) -> str:
         build_dir = test_dir / "build"
         build_dir.mkdir(exist_ok=True)
@@ -274,7 +1062,194 @@ class StandardOutputChecker:
         return path
 
 
+# 常驻特判进程的启动代码：加载一次特判脚本，然后从私有管道按行读取 JSON 请求。
+# 每个请求在 fork 出的副本中以与单独运行脚本时相同的方式（stdin 为 input_data）
+# 调用一次 judge()，因此请求之间不共享脚本的全局状态；结果写入另一个私有管道。
+_JUDGE_WORKER_SOURCE = r"""
+import importlib.util, io, json, os, sys, traceback
+
+script, request_fd, response_fd = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+sys.path.insert(0, os.path.dirname(script))
+spec = importlib.util.spec_from_file_location("_grader_judge", script)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+
+for line in os.fdopen(request_fd, "r"):
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        continue
+    stdout, stderr = io.StringIO(), io.StringIO()
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(json.loads(line)), stdout, stderr
+    try:
+        module.judge()
+    except SystemExit:
+        pass
+    except BaseException:
+        traceback.print_exc()
+    with os.fdopen(response_fd, "w", closefd=False) as responses:
+        responses.write(
+            json.dumps({"stdout": stdout.getvalue(), "stderr": stderr.getvalue()})
+            + "\n"
+        )
+    os._exit(0)
+"""
+
+
+class JudgeWorkerPool:
+    """常驻的特判进程池，每个特判脚本只加载一次，避免每次检查都启动解释器
+
+    只有在顶层定义了 judge() 的特判脚本使用常驻进程（见 supports）：其他脚本的
+    逻辑在模块顶层，每次调用都要重新执行，仍然每次启动新解释器。常驻进程通过
+    私有管道收发请求，标准输入输出不受特判脚本影响；每个请求在 fork 出的副本中
+    处理，上一个测试点留下的全局状态不会影响下一个。等待结果的时间受 timeout
+    限制，超时后杀死整个进程组，下次使用时重新启动。
+    """
+
+    def __init__(self):
+        self._idle: Dict[str, List[subprocess.Popen]] = {}
+        # 特判脚本路径 -> (mtime_ns, 是否定义了 judge())
+        self._supported: Dict[str, Tuple[int, bool]] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def supports(self, judge_script: Path) -> bool:
+        """特判脚本是否能使用常驻进程：需要 fork，且脚本在顶层定义了 judge()"""
+        import ast
+
+        if not hasattr(os, "fork"):
+            return False
+        key = str(judge_script.resolve())
+        try:
+            mtime = os.stat(key).st_mtime_ns
+        except OSError:
+            return False
+        cached = self._supported.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(key, "rb") as f:
+                tree = ast.parse(f.read(), key)
+            supported = any(
+                isinstance(node, ast.FunctionDef) and node.name == "judge"
+                for node in tree.body
+            )
+        except (OSError, SyntaxError, ValueError):
+            supported = False
+        self._supported[key] = (mtime, supported)
+        return supported
+
+    def run(
+        self, judge_script: Path, input_json: str, timeout: Optional[float] = None
+    ) -> str:
+        """把 input_data 交给特判脚本的 judge() 处理，返回它写到 stdout 的内容"""
+        key = str(judge_script.resolve())
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            worker = idle.pop() if idle else None
+        if worker is None:
+            worker = self._spawn(key)
+
+        try:
+            worker.requests.write(json.dumps(input_json) + "\n")
+            worker.requests.flush()
+            response = json.loads(self._read_line(worker, timeout))
+        except BaseException:
+            self._kill(worker)
+            raise
+
+        with self._lock:
+            self._idle[key].append(worker)
+        return response["stdout"]
+
+    @staticmethod
+    def _spawn(key: str) -> subprocess.Popen:
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        try:
+            worker = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-c",
+                    _JUDGE_WORKER_SOURCE,
+                    key,
+                    str(request_read),
+                    str(response_write),
+                ],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                pass_fds=(request_read, response_write),
+                # 超时时用 killpg 同时杀死正在处理请求的副本
+                start_new_session=True,
+            )
+        except BaseException:
+            os.close(request_write)
+            os.close(response_read)
+            raise
+        finally:
+            os.close(request_read)
+            os.close(response_write)
+        worker.requests = os.fdopen(request_write, "w")
+        worker.responses = response_read
+        worker.buffer = b""
+        return worker
+
+    @staticmethod
+    def _read_line(worker: subprocess.Popen, timeout: Optional[float]) -> str:
+        import selectors
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(worker.responses, selectors.EVENT_READ)
+            while b"\n" not in worker.buffer:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and (
+                    remaining <= 0 or not selector.select(remaining)
+                ):
+                    raise subprocess.TimeoutExpired(worker.args[3], timeout)
+                chunk = os.read(worker.responses, 1 << 16)
+                if not chunk:
+                    raise RuntimeError("judge worker exited unexpectedly")
+                worker.buffer += chunk
+        line, _, worker.buffer = worker.buffer.partition(b"\n")
+        return line.decode()
+
+    @staticmethod
+    def _kill(worker: subprocess.Popen) -> None:
+        import signal
+
+        try:
+            os.killpg(worker.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        worker.wait()
+        try:
+            worker.requests.close()
+        except OSError:
+            pass
+        os.close(worker.responses)
+
+    def close(self) -> None:
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+        for worker in workers:
+            try:
+                worker.requests.close()
+            except OSError:
+                pass
+            try:
+                worker.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self._kill(worker)
+                continue
+            os.close(worker.responses)
+
+
 class SpecialJudgeChecker:
+    def __init__(self, workers: Optional[JudgeWorkerPool] = None):
+        self.workers = workers
+
     def check(
         self,
         step: Dict[str, Any],
@@ -302,15 +1277,17 @@ class SpecialJudgeChecker:
             "test_dir": str(test_dir),
             "max_score": step.get("score", 0),
         }
+        # 输出被截断时，特判脚本可以从这些文件中读取完整内容
+        for key, value in (("stdout_path", output), ("stderr_path", error)):
+            if isinstance(value, CapturedOutput) and value.truncated:
+                input_data[key] = str(value.spill_path)
 
         try:
-            process = subprocess.run(
-                [sys.executable, str(judge_script)],
-                input=json.dumps(input_data),
-                capture_output=True,
-                text=True,
+            result = json.loads(
+                self._run_judge(
+                    judge_script, json.dumps(input_data), step.get("timeout", 5.0)
+                )
             )
-            result = json.loads(process.stdout)
             if "score" in result:
                 result["score"] = min(result["score"], step.get("score", 0))
             return (
@@ -321,6 +1298,25 @@ class SpecialJudgeChecker:
         except Exception as e:
             return False, f"Special judge failed: {str(e)}", None
 
+    def _run_judge(self, judge_script: Path, input_json: str, timeout: float) -> str:
+        """运行特判脚本，等待时间超过 timeout（步骤的超时）时抛出 TimeoutExpired"""
+        if self.workers is not None and self.workers.supports(judge_script):
+            try:
+                return self.workers.run(judge_script, input_json, timeout)
+            except subprocess.TimeoutExpired:
+                raise
+            except Exception:
+                # 常驻进程不可用时退回到每次启动新解释器的方式
+                pass
+        process = subprocess.run(
+            [sys.executable, str(judge_script)],
+            input=input_json,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+        return process.stdout
+
 
 class PatternChecker:
     def check(
@@ -334,7 +1330,7 @@ class PatternChecker:
         check = step.get("check", {})
 
         if "stdout_pattern" in check:
-            if not re.search(check["stdout_pattern"], output, re.MULTILINE):
+            if not self._search(check["stdout_pattern"], output):
                 return (
                     False,
                     f"Output does not match pattern {check['stdout_pattern']!r}",
@@ -342,7 +1338,7 @@ class PatternChecker:
                 )
 
         if "stderr_pattern" in check:
-            if not re.search(check["stderr_pattern"], error, re.MULTILINE):
+            if not self._search(check["stderr_pattern"], error):
                 return (
                     False,
                     f"Error output does not match pattern {check['stderr_pattern']!r}",
@@ -351,12 +1347,94 @@ class PatternChecker:
 
         return True, "All pattern checks passed", None
 
+    @staticmethod
+    def _search(pattern: str, text: str) -> bool:
+        if isinstance(text, CapturedOutput) and text.truncated:
+            # 在完整输出的内存映射上匹配，避免把整个文件读入内存
+            if text.total_bytes == 0:
+                return re.search(pattern, "", re.MULTILINE) is not None
+            with open(text.spill_path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                return re.search(pattern.encode(), mapped, re.MULTILINE) is not None
+        return re.search(pattern, text, re.MULTILINE) is not None
+
+
+# 把步骤变为性能检查的 [run.check] 键
+PERFORMANCE_CHECKS = ("repeat", "max_median_ms", "max_p95_ms", "max_rss_mb")
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    """最近秩法计算百分位数"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class PerformanceChecker:
+    """根据多次运行的耗时和内存评判步骤的性能
+
+    samples 中每一项是一次运行的 {"wall_ms": ..., "max_rss_kb": ...}。每个限制
+    按 min(1, 限制 / 实测值) 计算得分比例，多个限制取最小值；步骤设置了 score 时
+    按比例给部分分，否则超出任一限制即判为失败。例如：
+
+        [run.check]
+        repeat = 5             # 计时 5 次
+        max_median_ms = 200    # 耗时中位数上限
+        max_rss_mb = 64        # 各次运行中最大常驻内存的上限
+
+    最大常驻内存无法测量时（见 RusagePopen）不检查 max_rss_mb。
+    """
+
+    def check(
+        self, step: Dict[str, Any], samples: List[Dict[str, Any]]
+    ) -> Tuple[bool, str, Optional[float], Dict[str, Any]]:
+        check = step.get("check", {})
+        wall = [sample["wall_ms"] for sample in samples]
+        stats: Dict[str, Any] = {
+            "repeat": len(samples),
+            "median_ms": round(percentile(wall, 50), 3),
+            "p95_ms": round(percentile(wall, 95), 3),
+        }
+        rss = [s["max_rss_kb"] for s in samples if s.get("max_rss_kb") is not None]
+        if rss:
+            stats["max_rss_mb"] = round(max(rss) / 1024, 2)
+
+        limits = [
+            ("Median time", "max_median_ms", stats["median_ms"], "ms"),
+            ("P95 time", "max_p95_ms", stats["p95_ms"], "ms"),
+            ("Max RSS", "max_rss_mb", stats.get("max_rss_mb"), "MB"),
+        ]
+        fraction = 1.0
+        exceeded = []
+        for label, key, measured, unit in limits:
+            if key not in check or measured is None:
+                continue
+            limit = float(check[key])
+            if measured > limit:
+                fraction = min(fraction, limit / measured if measured > 0 else 0.0)
+                exceeded.append(
+                    f"{label} {measured:.1f} {unit} exceeds limit {limit:g} {unit}"
+                )
+
+        if not exceeded:
+            return True, "Performance checks passed", None, stats
+        message = "; ".join(exceeded)
+        if "score" not in step:
+            return False, message, None, stats
+        return (
+            True,
+            f"{message} ({fraction:.0%} credit)",
+            round(step["score"] * fraction, 2),
+            stats,
+        )
+
 
 class CompositeChecker:
-    def __init__(self):
+    def __init__(self, judge_workers: Optional[JudgeWorkerPool] = None):
         self.checkers = [
             StandardOutputChecker(),
-            SpecialJudgeChecker(),
+            SpecialJudgeChecker(judge_workers),
             PatternChecker(),
         ]
 
@@ -377,112 +1455,1063 @@ class CompositeChecker:
         return True, "All checks passed", None
 
 
-class TestRunner:
-    def __init__(
-        self,
-        config: Config,
-        console: Optional[Console] = None,
-        verbose: bool = False,
-        dry_run: bool = False,
-        no_check: bool = False,
-    ):
-        self.config = config
-        self.console = console
-        self.checker = CompositeChecker()
-        self.verbose = verbose
-        self.dry_run = dry_run
-        self.no_check = no_check
+# (路径, 模式) -> (mtime, 大小, 摘要)；同一文件被修改后覆盖旧条目，
+# 并按最近使用淘汰，长时间运行的 watch 会话中也不会无限增长
+_file_digests: "OrderedDict[Tuple[str, str], Tuple[int, int, str]]" = OrderedDict()
+_file_digests_lock = threading.Lock()
+FILE_DIGEST_CACHE_SIZE = 4096
 
-    def run_test(self, test: TestCase) -> TestResult:
-        start_time = time.perf_counter()
-        try:
-            # 清理和创建构建目录
-            build_dir = test.path / "build"
-            if build_dir.exists():
-                for file in build_dir.iterdir():
-                    if file.is_file():
-                        file.unlink()
-            build_dir.mkdir(exist_ok=True)
+DIGEST_MODES = ("bytes", "fle")
 
-            # 在dry-run模式下，显示测试点信息
-            if self.dry_run:
-                if self.console and not isinstance(self.console, type):
-                    self.console.print(f"[bold]Test case:[/bold] {test.meta['name']}")
-                    if "description" in test.meta:
-                        self.console.print(
-                            f"[bold]Description:[/bold] {test.meta['description']}"
-                        )
-                return self._execute_test_steps(test)
 
-            result = None
-            if self.console and not isinstance(self.console, type):
-                # 在 rich 环境下显示进度条
-                status_icons = {
-                    "PASS": "[green]✓[/green]",
-                    "PARTIAL": "[yellow]~[/yellow]",
-                    "FAIL": "[red]✗[/red]",
-                }
-                with Progress(
-                    SpinnerColumn(finished_text=status_icons["FAIL"]),
-                    TextColumn("[progress.description]{task.description}"),
-                    console=self.console,
-                ) as progress:
-                    total_steps = len(test.run_steps)
-                    task = progress.add_task(
-                        f"Running {test.meta['name']} [0/{total_steps}]...",
-                        total=total_steps,
-                    )
-                    result = self._execute_test_steps(test, progress, task)
-                    # 根据状态设置图标
-                    progress.columns[0].finished_text = status_icons[result.status]
-                    # 更新最终状态，移除Running字样，加上结果提示
-                    final_status = {
-                        "PASS": "[green]Passed[/green]",
-                        "PARTIAL": "[yellow]Partial[/yellow]",
-                        "FAIL": "[red]Failed[/red]",
-                    }[result.status]
-                    progress.update(
-                        task,
-                        completed=total_steps,
-                        description=f"{test.meta['name']} [{total_steps}/{total_steps}]: {final_status}",
-                    )
+def file_digest(path: Path, mode: str = "bytes") -> str:
+    """计算文件内容的 SHA-256，按 (路径, 模式, mtime, 大小) 在进程内做 LRU 缓存
 
-                # 如果测试失败，在进度显示完成后输出失败信息
-                if not result.success and not self.dry_run:
-                    for error_details in result.error_details:
-                        # 获取失败的步骤信息
-                        step_index = error_details["step"]
+    bytes 模式通过 mmap 直接对文件的原始字节求哈希，不会把整个文件读入内存；
+    fle 模式对 FLE 文件的规范化 JSON 表示求哈希，见 canonical_fle。
+    """
+    stat = path.stat()
+    memo_key = (str(path), mode)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _file_digests_lock:
+        cached = _file_digests.get(memo_key)
+        if cached is not None and cached[:2] == version:
+            _file_digests.move_to_end(memo_key)
+            return cached[2]
+    if mode == "bytes":
+        hasher = hashlib.sha256()
+        if stat.st_size:
+            with open(path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                hasher.update(mapped)
+        digest = hasher.hexdigest()
+    elif mode == "fle":
+        digest = hashlib.sha256(canonical_fle(path)).hexdigest()
+    else:
+        raise ValueError(f"Unknown digest mode {mode!r}")
+    with _file_digests_lock:
+        _file_digests[memo_key] = (*version, digest)
+        _file_digests.move_to_end(memo_key)
+        while len(_file_digests) > FILE_DIGEST_CACHE_SIZE:
+            _file_digests.popitem(last=False)
+    return digest
+
+
+def canonical_fle(path: Path) -> bytes:
+    """返回 FLE 文件的规范化 JSON：去掉开头的 #! 行，按键排序并去掉所有格式空白"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(b"#!"):
+        newline = data.find(b"\n")
+        data = data[newline + 1 :] if newline >= 0 else b""
+    try:
+        content = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"'{path.name}' is not a valid FLE file: {e}") from None
+    return json.dumps(
+        content, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
 
-                        self.console.print(
-                            f"\n[red]Test '{test.meta['name']}' failed at step {step_index}:[/red]"
-                        )
-                        self.console.print(f"Command: {error_details['command']}")
 
-                        if "stdout" in error_details:
-                            self.console.print("\nActual output:")
-                            self.console.print(error_details["stdout"].strip())
+class StepCache:
+    """以内容哈希为键的步骤结果缓存
 
-                        if "stderr" in error_details:
-                            self.console.print("\nError output:")
-                            self.console.print(error_details["stderr"].strip())
+    每个缓存项是缓存目录下以键命名的子目录，保存步骤产生的构建产物以及
+    stdout、stderr 和返回值。缓存总大小超过上限时按最近使用时间淘汰。
 
-                        if "expected_output" in error_details:
-                            self.console.print("\nExpected output:")
-                            self.console.print(error_details["expected_output"])
+    缓存目录中还有 --bench-linker 和 fuzz 的工作目录，只有以 SHA-256 键命名的
+    子目录才是缓存项。第一次写入时扫描一次缓存目录，之后在内存中维护各缓存项的
+    大小和访问时间。
+    """
 
-                        if "error_message" in error_details:
-                            self.console.print("\nError details:")
-                            self.console.print(f"  {error_details['error_message']}")
+    KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+    def __init__(self, cache_dir: Path, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 键 -> [访问时间, 大小]，第一次写入时才扫描缓存目录
+        self._entries: Optional[Dict[str, List[float]]] = None
+        self._total_size = 0
+
+    def lookup(
+        self, key: str, build_dir: Path, args: List[str]
+    ) -> Optional[subprocess.CompletedProcess]:
+        entry = self.cache_dir / key
+        try:
+            with open(entry / "meta.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            for name in meta["files"]:
+                shutil.copy2(entry / "files" / name, build_dir / name)
+            # 更新访问时间，用于 LRU 淘汰
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
 
-                        if "return_code" in error_details:
-                            self.console.print(
-                                f"\nReturn code: {error_details['return_code']}"
-                            )
+        with self._lock:
+            self.hits += 1
+            if self._entries is not None and key in self._entries:
+                self._entries[key][0] = time.time()
+        return subprocess.CompletedProcess(
+            args, meta["returncode"], meta["stdout"], meta["stderr"]
+        )
 
-                        self.console.print()  # 添加一个空行作为分隔
-                return result
+    def store(
+        self, key: str, process: subprocess.CompletedProcess, outputs: List[Path]
+    ) -> None:
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+        tmp_entry = self.cache_dir / f".tmp-{os.urandom(16).hex()}"
+        try:
+            (tmp_entry / "files").mkdir(parents=True)
+            size = 0
+            for output in outputs:
+                shutil.copy2(output, tmp_entry / "files" / output.name)
+                size += output.stat().st_size
+            with open(tmp_entry / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "returncode": process.returncode,
+                        "stdout": process.stdout,
+                        "stderr": process.stderr,
+                        "files": [output.name for output in outputs],
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            size += (tmp_entry / "meta.json").stat().st_size
+            # 先写入临时目录再重命名，保证其他进程不会读到不完整的缓存项
+            os.rename(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+        self._add_entry(key, size)
+
+    def summary(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _add_entry(self, key: str, size: int) -> None:
+        """记录新写入的缓存项，总大小超过上限时淘汰最久未使用的缓存项"""
+        with self._lock:
+            if self._entries is None:
+                # 扫描结果已经包含刚写入的缓存项
+                self._scan()
             else:
-                # 在非 rich 环境下直接执行
+                self._entries[key] = [time.time(), size]
+                self._total_size += size
+            if self._total_size <= self.max_size:
+                return
+            for key, (_, size) in sorted(
+                self._entries.items(), key=lambda item: item[1][0]
+            ):
+                if self._total_size <= self.max_size:
+                    break
+                shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+                del self._entries[key]
+                self._total_size -= size
+
+    def _scan(self) -> None:
+        self._entries = {}
+        for entry in self.cache_dir.iterdir():
+            if not self.KEY_PATTERN.fullmatch(entry.name) or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+                self._entries[entry.name] = [entry.stat().st_mtime, size]
+            except OSError:
+                # 其他评分器进程正在淘汰该缓存项
+                continue
+        self._total_size = sum(size for _, size in self._entries.values())
+
+
+class TestFingerprinter:
+    """计算测试点输入的指纹，--changed 模式据此跳过输入未变化且上次通过的测试点
+
+    指纹包含测试目录（build 目录除外）和公共目录中的所有文件，以及测试步骤
+    用到的 ${root_dir} 工具。在 [fingerprint.tools] 中配置了源文件的工具按源文件
+    （加上 [fingerprint].shared）计算，其余工具按解析符号链接后的二进制计算。
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+
+    def compute(self, test: TestCase) -> str:
+        hasher = hashlib.sha256()
+        build_dir = test.path / "build"
+        for path in self._files([test.path], exclude=build_dir):
+            hasher.update(f"test:{path.relative_to(test.path)}:".encode())
+            hasher.update(file_digest(path).encode())
+        common_dir = self.config.paths["common_dir"]
+        for path in self._files([common_dir]):
+            hasher.update(f"common:{path.relative_to(common_dir)}:".encode())
+            hasher.update(file_digest(path).encode())
+        for tool in sorted(self._tools(test)):
+            hasher.update(f"tool:{tool}:{self._tool_digest(tool)}".encode())
+        return hasher.hexdigest()
+
+    def _tools(self, test: TestCase) -> Set[str]:
+        tools = set()
+        for step in test.run_steps:
+            match = re.match(r"^\$\{root_dir\}/(.+)$", step["command"])
+            if match:
+                tools.add(match.group(1))
+        return tools
+
+    def _tool_digest(self, tool: str) -> str:
+        fingerprint_config = self.config.fingerprint_config
+        root = self.config.project_root
+        sources = fingerprint_config["tools"].get(tool)
+        if sources is None:
+            binary = (root / tool).resolve()
+            return file_digest(binary) if binary.is_file() else "missing"
+
+        hasher = hashlib.sha256()
+        patterns = list(fingerprint_config["shared"]) + list(sources)
+        for path in self._files([root / pattern for pattern in patterns]):
+            hasher.update(f"{path.relative_to(root)}:".encode())
+            hasher.update(file_digest(path).encode())
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _files(paths: List[Path], exclude: Optional[Path] = None) -> List[Path]:
+        files = set()
+        for path in paths:
+            if path.is_file():
+                files.add(path)
+            elif path.is_dir():
+                files.update(
+                    f
+                    for f in path.rglob("*")
+                    if f.is_file() and (exclude is None or exclude not in f.parents)
+                )
+        return sorted(files)
+
+
+class SetupStepCache:
+    """准备步骤的输入/输出记录，输入、输出和命令都没有变化时跳过该步骤
+
+    只对同时声明了 inputs 和 outputs（相对于项目根目录的 glob）的步骤生效。
+    步骤成功后记录命令（含 env 中列出的环境变量）以及所有输入、输出文件的哈希。
+    之后的运行中，命令相同、输出都存在且输入文件集合不变时：若所有输出都比
+    所有输入新（与 make 相同的判断），或者输入和输出的哈希与记录一致（例如只是
+    touch 了文件或切换分支后又切回），就跳过该步骤。
+    """
+
+    VERSION = 1
+
+    def __init__(self, project_root: Path, state_file: Path):
+        self.project_root = project_root
+        self.state_file = state_file
+        self._state: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def cacheable(step: Dict[str, Any]) -> bool:
+        return "inputs" in step and "outputs" in step
+
+    def fresh(self, step: Dict[str, Any]) -> bool:
+        if not self.cacheable(step):
+            return False
+        record = self._records().get(step["name"])
+        if record is None or record["command"] != self._command_digest(step):
+            return False
+        outputs = self._expand(step["outputs"])
+        if not outputs or sorted(outputs) != sorted(record["outputs"]):
+            return False
+        inputs = self._expand(step["inputs"])
+        if sorted(inputs) != sorted(record["inputs"]):
+            return False
+
+        try:
+            if inputs and min(
+                os.stat(self.project_root / path).st_mtime_ns for path in outputs
+            ) >= max(os.stat(self.project_root / path).st_mtime_ns for path in inputs):
+                return True
+        except OSError:
+            return False
+        return (
+            self._digests(inputs) == record["inputs"]
+            and self._digests(outputs) == record["outputs"]
+        )
+
+    def saved_time(self, step: Dict[str, Any]) -> float:
+        """跳过该步骤节省的时间（上一次实际运行的耗时）"""
+        record = self._records().get(step["name"], {})
+        return record.get("duration", 0.0)
+
+    def record(self, step: Dict[str, Any], duration: float) -> None:
+        if not self.cacheable(step):
+            return
+        self._records()[step["name"]] = {
+            "command": self._command_digest(step),
+            "inputs": self._digests(self._expand(step["inputs"])),
+            "outputs": self._digests(self._expand(step["outputs"])),
+            "duration": round(duration, 3),
+        }
+        self._save()
+
+    def _records(self) -> Dict[str, Any]:
+        if self._state is None:
+            try:
+                with open(self.state_file, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("version") != self.VERSION:
+                    raise ValueError("version mismatch")
+            except (OSError, ValueError):
+                state = {"version": self.VERSION, "steps": {}}
+            self._state = state
+        return self._state["steps"]
+
+    def _save(self) -> None:
+        tmp = self.state_file.with_name(f"{self.state_file.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            # 记录写入失败只会导致下次不能跳过
+            tmp.unlink(missing_ok=True)
+
+    def _expand(self, patterns: List[str]) -> List[str]:
+        files = set()
+        for pattern in patterns:
+            for path in self.project_root.glob(pattern):
+                if path.is_file():
+                    files.add(str(path.relative_to(self.project_root)))
+        return sorted(files)
+
+    def _digests(self, paths: List[str]) -> Dict[str, str]:
+        return {path: file_digest(self.project_root / path) for path in paths}
+
+    @staticmethod
+    def _command_digest(step: Dict[str, Any]) -> str:
+        args = step.get("args", [])
+        command = {
+            "command": step["command"],
+            "args": args if isinstance(args, list) else [args],
+            "env": {name: os.environ.get(name) for name in step.get("env", [])},
+        }
+        return hashlib.sha256(json.dumps(command, sort_keys=True).encode()).hexdigest()
+
+
+class ResultStore:
+    """测试历史记录（SQLite 数据库，默认 .test_results.db）
+
+    每次运行追加一条 runs 记录和每个测试点一条 results 记录，写入在同一个
+    BEGIN IMMEDIATE 事务中完成：并发运行的评分器由 SQLite 的文件锁串行化，
+    中途退出也不会留下不完整的记录。失败步骤的 stdout/stderr 按 sha256 去重、
+    用 zlib 压缩后存放在 blobs 表中。只保留最近 retention 次运行。
+
+    -l、-f 和分片均衡只查询需要的列（有索引），不需要读出全部历史。首次使用时
+    会导入旧版的 .test_history JSON 文件。
+    """
+
+    FILE = ".test_results.db"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        total_score REAL NOT NULL,
+        max_score REAL NOT NULL,
+        percentage REAL NOT NULL,
+        shard TEXT
+    );
+    CREATE TABLE IF NOT EXISTS results (
+        run_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        build_path TEXT,
+        status TEXT NOT NULL,
+        score REAL,
+        max_score REAL,
+        time REAL,
+        message TEXT,
+        step_scores TEXT,
+        step_usage TEXT,
+        error TEXT,
+        stdout_hash TEXT,
+        stderr_hash TEXT,
+        PRIMARY KEY (run_id, position)
+    );
+    CREATE INDEX IF NOT EXISTS results_path ON results (path, run_id);
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        data BLOB NOT NULL
+    );
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        retention: int = 10,
+        legacy_file: Optional[Path] = None,
+    ):
+        self.path = path
+        self.retention = max(1, retention)
+        self.legacy_file = legacy_file
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+        import sqlite3
+
+        connection = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(self.SCHEMA)
+        self._connection = connection
+        if self.legacy_file is not None and self.legacy_file.exists():
+            self._import_legacy()
+        return connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def record_run(self, run: Dict[str, Any]) -> None:
+        """追加一次运行（格式与 Grader._save_test_history 构造的记录相同）"""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert_run(connection, run)
+            self._apply_retention(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _insert_run(self, connection, run: Dict[str, Any]) -> None:
+        cursor = connection.execute(
+            "INSERT INTO runs (timestamp, total_score, max_score, percentage, shard) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                run["timestamp"],
+                run["total_score"],
+                run["max_score"],
+                run["percentage"],
+                run.get("shard"),
+            ),
+        )
+        run_id = cursor.lastrowid
+        rows = []
+        for position, test in enumerate(run["tests"]):
+            # stdout/stderr 可能很大，单独去重压缩存放；只要有错误详情就写入 error 列
+            # （即使只剩 {}），读取时才能据此还原输出
+            details = test.get("error_details")
+            error = dict(details or {})
+            hashes = [
+                self._store_blob(connection, error.pop(key, None))
+                for key in ("stdout", "stderr")
+            ]
+            rows.append(
+                (
+                    run_id,
+                    position,
+                    test["path"],
+                    test["name"],
+                    test.get("description", ""),
+                    test.get("build_path"),
+                    test["status"],
+                    test["score"],
+                    test["max_score"],
+                    test["time"],
+                    test.get("message"),
+                    json.dumps(test.get("step_scores")),
+                    json.dumps(test.get("step_usage")),
+                    json.dumps(error, ensure_ascii=False) if details else None,
+                    *hashes,
+                )
+            )
+        connection.executemany(
+            "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    @staticmethod
+    def _store_blob(connection, text: Optional[str]) -> Optional[str]:
+        if text is None:
+            return None
+        import zlib
+
+        data = text.encode("utf-8", errors="replace")
+        digest = hashlib.sha256(data).hexdigest()
+        connection.execute(
+            "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+            (digest, zlib.compress(data)),
+        )
+        return digest
+
+    def _apply_retention(self, connection) -> None:
+        row = connection.execute(
+            "SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (self.retention - 1,),
+        ).fetchone()
+        if row is None:
+            return
+        connection.execute("DELETE FROM results WHERE run_id < ?", (row["id"],))
+        connection.execute("DELETE FROM runs WHERE id < ?", (row["id"],))
+        connection.execute(
+            "DELETE FROM blobs WHERE hash NOT IN "
+            "(SELECT stdout_hash FROM results WHERE stdout_hash IS NOT NULL "
+            "UNION SELECT stderr_hash FROM results WHERE stderr_hash IS NOT NULL)"
+        )
+
+    def _import_legacy(self) -> None:
+        """把旧版 .test_history 中的记录导入空数据库，然后改名保留原文件
+
+        多个评分器可能同时打开新数据库，因此在写事务中再次检查数据库是否为空，
+        只有一个评分器会导入；改名时原文件可能已被另一个评分器改名。
+        """
+        connection = self._connection
+        if connection.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is not None:
+            return
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None:
+                for run in history[-self.retention :]:
+                    self._insert_run(connection, run)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        try:
+            self.legacy_file.rename(
+                self.legacy_file.with_name(self.legacy_file.name + ".bak")
+            )
+        except FileNotFoundError:
+            pass
+
+    def _last_run_id(self) -> Optional[int]:
+        row = self._connect().execute("SELECT MAX(id) AS id FROM runs").fetchone()
+        return row["id"]
+
+    def last_failed(self) -> Optional[List[Dict[str, Any]]]:
+        """最近一次运行中未通过的测试点（按运行顺序）；没有任何记录时返回 None"""
+        run_id = self._last_run_id()
+        if run_id is None:
+            return None
+        rows = self._connect().execute(
+            "SELECT name, path, build_path, status FROM results "
+            "WHERE run_id = ? AND status != 'PASS' ORDER BY position",
+            (run_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def durations(self) -> Dict[str, float]:
+        """每个测试目录最近一次运行的耗时（秒），按目录名索引
+
+        忽略分片运行写入的记录：依次在本地运行各分片时，先完成的分片会更新历史
+        记录，如果计入这些记录，后面的分片就会得到不同的划分。
+        """
+        rows = self._connect().execute(
+            "SELECT results.path, results.time FROM results "
+            "JOIN runs ON runs.id = results.run_id "
+            "WHERE runs.shard IS NULL ORDER BY results.run_id"
+        )
+        return {Path(row["path"]).name: float(row["time"]) for row in rows}
+
+    def statuses(self) -> Dict[str, str]:
+        """每个测试目录最近一次运行的状态（PASS/PARTIAL/FAIL），按目录名索引"""
+        rows = self._connect().execute(
+            "SELECT path, status FROM results ORDER BY run_id"
+        )
+        return {Path(row["path"]).name: row["status"] for row in rows}
+
+    def runs(
+        self, limit: Optional[int] = None, with_outputs: bool = False
+    ) -> List[Dict[str, Any]]:
+        """最近的运行记录（从旧到新），格式与写入时相同"""
+        connection = self._connect()
+        runs = [
+            dict(row)
+            for row in connection.execute(
+                "SELECT * FROM runs ORDER BY id DESC LIMIT ?",
+                (-1 if limit is None else limit,),
+            )
+        ][::-1]
+        for run in runs:
+            run["tests"] = []
+            for row in connection.execute(
+                "SELECT * FROM results WHERE run_id = ? ORDER BY position",
+                (run["id"],),
+            ):
+                test = dict(row)
+                for key in ("step_scores", "step_usage"):
+                    test[key] = json.loads(test[key]) if test[key] else None
+                error = test.pop("error")
+                error = json.loads(error) if error else None
+                digests = {key: test.pop(f"{key}_hash") for key in ("stdout", "stderr")}
+                if error is not None and with_outputs:
+                    for key, digest in digests.items():
+                        if digest is not None:
+                            error[key] = self.output(digest)
+                test["error_details"] = error
+                run["tests"].append(test)
+        return runs
+
+    def output(self, digest: str) -> Optional[str]:
+        import zlib
+
+        row = (
+            self._connect()
+            .execute("SELECT data FROM blobs WHERE hash = ?", (digest,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return zlib.decompress(row["data"]).decode("utf-8")
+
+
+class TestCaseIndex:
+    """测试点索引，每次运行只扫描一次 cases_dir，并在多次运行之间缓存解析结果
+
+    测试目录列表按 cases_dir 及其每个子目录的 mtime 缓存（在已有的子目录中添加或
+    删除 config.toml 只会改变该子目录的 mtime），每个测试点解析后的 config.toml
+    按该文件的 (mtime, 大小) 缓存，与测试历史记录和指纹一样以带版本号的 JSON
+    格式保存在索引文件中（比重新解析 TOML 快）。分组、前缀匹配、
+    重新运行失败测试点以及生成 VS Code 配置都共用同一个索引。
+    """
+
+    VERSION = 3
+
+    def __init__(self, cases_dir: Path, index_file: Path):
+        self.cases_dir = cases_dir
+        self.index_file = index_file
+        self._directories: Optional[List[Path]] = None
+        self._cases: Dict[str, TestCase] = {}
+        self._dirty = False
+        self._data = self._read()
+
+    @staticmethod
+    def sort_key(path: Path) -> tuple:
+        # 尝试从文件夹名称中提取数字前缀
+        match = re.match(r"(\d+)", path.name)
+        if match:
+            # 如果有数字前缀，返回 (0, 数字值, 文件夹名) 元组
+            # 0 表示优先级最高
+            return (0, int(match.group(1)), path.name)
+        else:
+            # 如果没有数字前缀，返回 (1, 0, 文件夹名) 元组
+            # 1 表示优先级较低，这些文件夹会按字母顺序排在有数字前缀的文件夹后面
+            return (1, 0, path.name)
+
+    def directories(self) -> List[Path]:
+        """返回所有包含 config.toml 的测试目录，按编号排序"""
+        if self._directories is None:
+            mtime = self.cases_dir.stat().st_mtime_ns
+            listing = self._data["listing"]
+            if listing.get("mtime_ns") == mtime and self._subdirs_unchanged(
+                listing["subdirs"]
+            ):
+                names = listing["names"]
+            else:
+                subdirs = {}
+                names = []
+                for entry in os.scandir(self.cases_dir):
+                    if not entry.is_dir():
+                        continue
+                    subdirs[entry.name] = entry.stat().st_mtime_ns
+                    if os.path.exists(os.path.join(entry.path, "config.toml")):
+                        names.append(entry.name)
+                self._data["listing"] = {
+                    "mtime_ns": mtime,
+                    "subdirs": subdirs,
+                    "names": names,
+                }
+                self._dirty = True
+            self._directories = sorted(
+                (self.cases_dir / name for name in names), key=self.sort_key
+            )
+        return self._directories
+
+    def _subdirs_unchanged(self, subdirs: Dict[str, int]) -> bool:
+        for name, mtime in subdirs.items():
+            try:
+                if os.stat(os.path.join(self.cases_dir, name)).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def load(self, test_path: Path) -> TestCase:
+        """返回测试目录对应的测试点，配置不合法时抛出 ValueError"""
+        key = str(test_path)
+        test = self._cases.get(key)
+        if test is not None:
+            return test
+
+        config_path = os.path.join(key, "config.toml")
+        stat = os.stat(config_path)
+        entry = self._data["cases"].get(key)
+        if (
+            entry is None
+            or entry["mtime_ns"] != stat.st_mtime_ns
+            or entry["size"] != stat.st_size
+        ):
+            with open(config_path, "rb") as f:
+                config = load_toml(f)
+            entry = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "config": config,
+            }
+            self._data["cases"][key] = entry
+            self._dirty = True
+
+        config = entry["config"]
+        if "meta" not in config:
+            raise ValueError("Missing 'meta' section in config")
+        if "name" not in config["meta"]:
+            raise ValueError("Missing 'name' in meta section")
+        if "score" not in config["meta"]:
+            raise ValueError("Missing 'score' in meta section")
+        if "run" not in config:
+            raise ValueError("Missing 'run' section in config")
+
+        test = TestCase(path=test_path, meta=config["meta"], run_steps=config["run"])
+        self._cases[key] = test
+        return test
+
+    def save(self) -> None:
+        """把有变化的索引写回磁盘（先写临时文件再原子替换）"""
+        if not self._dirty:
+            return
+        # 只保留仍然存在的测试目录
+        self._data["cases"] = {
+            key: entry
+            for key, entry in self._data["cases"].items()
+            if os.path.exists(os.path.join(key, "config.toml"))
+        }
+        tmp_file = self.index_file.with_name(
+            f"{self.index_file.name}.{os.urandom(16).hex()}.tmp"
+        )
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self.index_file)
+            self._dirty = False
+        except (OSError, TypeError, ValueError):
+            # TypeError：config.toml 中有 JSON 无法表示的值（如日期），此时不保存索引
+            tmp_file.unlink(missing_ok=True)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            # 反序列化会一次创建大量容器对象，期间暂停循环垃圾回收以免反复触发
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            if (
+                isinstance(data, dict)
+                and data.get("version") == self.VERSION
+                and data.get("cases_dir") == str(self.cases_dir)
+            ):
+                return data
+        except (OSError, ValueError):
+            # 索引文件不存在、损坏或是旧的格式时重新建立
+            pass
+        return {
+            "version": self.VERSION,
+            "cases_dir": str(self.cases_dir),
+            "listing": {},
+            "cases": {},
+        }
+
+
+class AsyncProcessExecutor:
+    """基于 asyncio 的子进程执行引擎
+
+    事件循环运行在独立的后台线程中，所有测试点和步骤的子进程都在同一个循环里
+    并发等待，同时运行的进程数由信号量限制。stdout 和 stderr 按块增量读取，
+    超时由事件循环处理，不占用额外的线程。
+
+    子进程由 RusagePopen 启动并在退出后回收，因此同样可以取得资源使用情况；没有
+    使用 asyncio.create_subprocess_exec，因为它无法取得子进程的 rusage。fork/exec
+    和等待启动器确认会阻塞，因此放在线程池中进行，不会阻塞事件循环。
+    """
+
+    def __init__(self, max_procs: int):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.max_procs = max(1, max_procs)
+        self._loop = asyncio.new_event_loop()
+        # 启动子进程以及不支持 pidfd 时等待子进程退出所用的线程，
+        # 信号量保证同时最多有 max_procs 个这样的操作
+        self._loop.set_default_executor(
+            ThreadPoolExecutor(self.max_procs, thread_name_prefix="grader-spawn")
+        )
+        self._semaphore: Optional["asyncio.Semaphore"] = None
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="grader-asyncio", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def run(
+        self,
+        args: List[str],
+        cwd: Path,
+        input: Optional[str] = None,
+        timeout: Optional[float] = None,
+        output_limit: int = 0,
+        spill_prefix: Optional[Path] = None,
+    ) -> subprocess.CompletedProcess:
+        """与 subprocess.run(capture_output=True, text=True) 行为一致的阻塞调用
+
+        output_limit 非 0 时，超出上限的输出写入 spill_prefix 加上 .stdout/.stderr
+        后缀的文件，返回的 stdout/stderr 为 CapturedOutput 预览。
+        """
+        import asyncio
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(args, cwd, input, timeout, output_limit, spill_prefix),
+            self._loop,
+        )
+        return future.result()
+
+    def close(self) -> None:
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=1)
+
+    async def _run(
+        self,
+        args: List[str],
+        cwd: Path,
+        input: Optional[str],
+        timeout: Optional[float],
+        output_limit: int,
+        spill_prefix: Optional[Path],
+    ) -> subprocess.CompletedProcess:
+        import asyncio
+        import tempfile
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_procs)
+
+        async with self._semaphore:
+            # 输入先写入临时文件再作为 stdin，避免与读取输出相互阻塞
+            stdin = None
+            if input is not None:
+                stdin = tempfile.TemporaryFile()
+                stdin.write(input.encode(locale.getpreferredencoding(False)))
+                stdin.seek(0)
+            try:
+                process = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: RusagePopen(
+                        args,
+                        cwd=cwd,
+                        stdin=stdin,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                    ),
+                )
+            finally:
+                if stdin is not None:
+                    stdin.close()
+
+            prefix = str(spill_prefix or Path(cwd) / ".output")
+            stdout = OutputCapture(output_limit, Path(prefix + ".stdout"))
+            stderr = OutputCapture(output_limit, Path(prefix + ".stderr"))
+
+            async def communicate() -> None:
+                await asyncio.gather(
+                    self._read_pipe(process.stdout, stdout),
+                    self._read_pipe(process.stderr, stderr),
+                )
+                await self._wait_process(process)
+
+            try:
+                await asyncio.wait_for(communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await self._wait_process(process)
+                stdout.finish()
+                stderr.finish()
+                raise subprocess.TimeoutExpired(args, timeout)
+
+        completed = subprocess.CompletedProcess(
+            args, process.returncode, stdout.finish(), stderr.finish()
+        )
+        completed.rusage = process.usage()
+        return completed
+
+    @staticmethod
+    async def _read_pipe(pipe: BinaryIO, capture: OutputCapture) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        try:
+            while True:
+                chunk = await reader.read(1 << 16)
+                if not chunk:
+                    break
+                capture.feed(chunk)
+        finally:
+            transport.close()
+
+    @staticmethod
+    async def _wait_process(process: RusagePopen) -> None:
+        """等待子进程退出，再通过 RusagePopen.wait() 回收以取得资源使用情况
+
+        优先用 pidfd 在事件循环中等待退出；不支持 pidfd 时（例如 macOS）在线程池
+        中阻塞等待。
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            pidfd = None
+
+        if pidfd is not None:
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+        else:
+            await loop.run_in_executor(None, process.wait)
+        # 子进程已经退出，wait() 会立即返回
+        process.wait()
+
+
+class TestRunner:
+    STATUS_ICONS = {
+        "PASS": "[green]✓[/green]",
+        "PARTIAL": "[yellow]~[/yellow]",
+        "FAIL": "[red]✗[/red]",
+    }
+
+    def __init__(
+        self,
+        config: Config,
+        console: Optional["Console"] = None,
+        verbose: bool = False,
+        dry_run: bool = False,
+        no_check: bool = False,
+        show_progress: bool = True,
+        step_jobs: int = 1,
+        cache: Optional[StepCache] = None,
+        executor: Optional[AsyncProcessExecutor] = None,
+        sample_tools: Optional[Set[str]] = None,
+        sample_repeat: int = 0,
+    ):
+        self.config = config
+        self.console = console
+        self.checker = CompositeChecker(
+            JudgeWorkerPool()
+            if config.grader_settings.get("persistent_judge", True)
+            else None
+        )
+        self.performance_checker = PerformanceChecker()
+        self.verbose = verbose
+        self.dry_run = dry_run
+        self.no_check = no_check
+        # 为 False 时不使用 rich 的动态进度条（并行运行测试点时使用）
+        self.show_progress = show_progress
+        # 单个测试点内并行执行互不依赖的步骤的最大数量
+        self.step_jobs = max(1, step_jobs or 1)
+        self._print_lock = threading.Lock()
+        self.cache = cache
+        # 为 None 时直接使用 subprocess.run 执行步骤
+        self.executor = executor
+        # 命令为这些工具（如 ld）的步骤重复运行 sample_repeat 次计时，耗时样本按
+        # (测试目录名, 步骤序号) 记录在 samples 中（grader.py baseline 使用）
+        self.sample_tools = sample_tools or set()
+        self.sample_repeat = sample_repeat
+        self.samples: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    def run_test(self, test: TestCase) -> TestResult:
+        start_time = time.perf_counter()
+        try:
+            # 清理和创建构建目录
+            build_dir = test.path / "build"
+            if build_dir.exists():
+                for file in build_dir.iterdir():
+                    if file.is_file():
+                        file.unlink()
+            build_dir.mkdir(exist_ok=True)
+
+            # 在dry-run模式下，显示测试点信息
+            if self.dry_run:
+                if self.console and not isinstance(self.console, type):
+                    self.console.print(f"[bold]Test case:[/bold] {test.meta['name']}")
+                    if "description" in test.meta:
+                        self.console.print(
+                            f"[bold]Description:[/bold] {test.meta['description']}"
+                        )
+                return self._execute_test_steps(test)
+
+            result = None
+            if self.console and not isinstance(self.console, type):
+                if self.show_progress:
+                    # 在 rich 环境下显示进度条
+                    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+                    with Progress(
+                        SpinnerColumn(finished_text=self.STATUS_ICONS["FAIL"]),
+                        TextColumn("[progress.description]{task.description}"),
+                        console=self.console,
+                    ) as progress:
+                        total_steps = len(test.run_steps)
+                        task = progress.add_task(
+                            f"Running {test.meta['name']} [0/{total_steps}]...",
+                            total=total_steps,
+                        )
+                        result = self._execute_test_steps(test, progress, task)
+                        # 根据状态设置图标
+                        progress.columns[0].finished_text = self.STATUS_ICONS[
+                            result.status
+                        ]
+                        # 更新最终状态，移除Running字样，加上结果提示
+                        progress.update(
+                            task,
+                            completed=total_steps,
+                            description=self._format_final_status(test, result),
+                        )
+                else:
+                    # 并行运行时不显示动态进度条，只输出最终状态行
+                    result = self._execute_test_steps(test)
+                    self.console.print(
+                        f"{self.STATUS_ICONS[result.status]} "
+                        f"{self._format_final_status(test, result)}"
+                    )
+
+                # 如果测试失败，在进度显示完成后输出失败信息
+                if not result.success and not self.dry_run:
+                    self._print_failure_details(test, result)
+                return result
+            else:
+                # 在非 rich 环境下直接执行
                 return self._execute_test_steps(test)
         except Exception as e:
             print(e)
@@ -495,10 +2524,50 @@ class TestRunner:
                 max_score=test.meta["score"],
             )
 
+    def _format_final_status(self, test: TestCase, result: TestResult) -> str:
+        total_steps = len(test.run_steps)
+        final_status = {
+            "PASS": "[green]Passed[/green]",
+            "PARTIAL": "[yellow]Partial[/yellow]",
+            "FAIL": "[red]Failed[/red]",
+        }[result.status]
+        return f"{test.meta['name']} [{total_steps}/{total_steps}]: {final_status}"
+
+    def _print_failure_details(self, test: TestCase, result: TestResult) -> None:
+        for error_details in result.error_details:
+            # 获取失败的步骤信息
+            step_index = error_details["step"]
+
+            self.console.print(
+                f"\n[red]Test '{test.meta['name']}' failed at step {step_index}:[/red]"
+            )
+            self.console.print(f"Command: {error_details['command']}")
+
+            if "stdout" in error_details:
+                self.console.print("\nActual output:")
+                self.console.print(error_details["stdout"].strip())
+
+            if "stderr" in error_details:
+                self.console.print("\nError output:")
+                self.console.print(error_details["stderr"].strip())
+
+            if "expected_output" in error_details:
+                self.console.print("\nExpected output:")
+                self.console.print(error_details["expected_output"])
+
+            if "error_message" in error_details:
+                self.console.print("\nError details:")
+                self.console.print(f"  {error_details['error_message']}")
+
+            if "return_code" in error_details:
+                self.console.print(f"\nReturn code: {error_details['return_code']}")
+
+            self.console.print()  # 添加一个空行作为分隔
+
     def _execute_test_steps(
         self,
         test: TestCase,
-        progress: Optional[Progress] = None,
+        progress: Optional["Progress"] = None,
         task: Optional[Any] = None,
     ) -> TestResult:
         start_time = time.perf_counter()
@@ -511,17 +2580,30 @@ class TestRunner:
             else test.meta["score"]
         )
         steps_error_details = []
+        step_usage = []
+
+        # 并行调度时先按依赖图执行所有步骤，再按原顺序汇总结果
+        graph_results = (
+            self._run_step_graph(test, progress, task)
+            if self.step_jobs > 1 and not self.dry_run and len(test.run_steps) > 1
+            else None
+        )
 
         for i, step in enumerate(test.run_steps, 1):
-            if progress is not None and task is not None:
-                step_name = step.get("name", step["command"])
-                progress.update(
-                    task,
-                    description=f"Running {test.meta['name']} [{i}/{len(test.run_steps)}]: {step_name}",
-                    completed=i - 1,
-                )
+            step_name = step.get("name", step["command"])
+            if graph_results is not None:
+                result = graph_results[i - 1]
+            else:
+                if progress is not None and task is not None:
+                    progress.update(
+                        task,
+                        description=f"Running {test.meta['name']} [{i}/{len(test.run_steps)}]: {step_name}",
+                        completed=i - 1,
+                    )
 
-            result = self._execute_single_step(test, step, i)
+                result = self._execute_single_step(test, step, i)
+            if result.step_usage:
+                step_usage.extend(result.step_usage)
             if not result.success and not self.dry_run:
                 steps_error_details.append(result.error_details)
                 if progress is not None and task is not None:
@@ -536,6 +2618,7 @@ class TestRunner:
                         max_score=max_possible_score,
                         step_scores=step_scores,
                         error_details=steps_error_details,
+                        step_usage=step_usage or None,
                     )
             total_score += result.score
             if result.step_scores:
@@ -564,8 +2647,146 @@ class TestRunner:
             max_score=max_possible_score,
             step_scores=step_scores,
             error_details=steps_error_details if steps_error_details else None,
+            step_usage=step_usage or None,
         )
 
+    def _run_step_graph(
+        self,
+        test: TestCase,
+        progress: Optional["Progress"] = None,
+        task: Optional[Any] = None,
+    ) -> Dict[int, TestResult]:
+        """按依赖关系并行执行测试点的步骤，返回以步骤下标（从 0 开始）为键的结果
+
+        must_pass 步骤失败后不再启动编号更大的步骤，但编号更小、尚未执行的步骤
+        仍会执行，因此按顺序汇总得到的分数和错误信息与串行执行完全一致。
+        """
+        deps = self._build_step_graph(test)
+        total_steps = len(test.run_steps)
+        results: Dict[int, TestResult] = {}
+        pending = set(range(total_steps))
+        running = {}
+        cutoff = total_steps
+
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(max_workers=self.step_jobs) as executor:
+            while True:
+                for i in sorted(pending):
+                    if len(running) >= self.step_jobs:
+                        break
+                    if i < cutoff and deps[i] <= results.keys():
+                        pending.discard(i)
+                        future = executor.submit(
+                            self._execute_single_step, test, test.run_steps[i], i + 1
+                        )
+                        running[future] = i
+                if not running:
+                    break
+
+                if progress is not None and task is not None:
+                    step_names = ", ".join(
+                        test.run_steps[i].get("name", test.run_steps[i]["command"])
+                        for i in sorted(running.values())
+                    )
+                    progress.update(
+                        task,
+                        description=f"Running {test.meta['name']} [{len(results)}/{total_steps}]: {step_names}",
+                        completed=len(results),
+                    )
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    result = future.result()
+                    results[i] = result
+                    if not result.success and test.run_steps[i].get("must_pass", True):
+                        cutoff = min(cutoff, i)
+
+        return results
+
+    def _build_step_graph(self, test: TestCase) -> List[Set[int]]:
+        """计算每个步骤依赖的步骤下标集合（从 0 开始）
+
+        优先使用步骤中显式声明的 depends_on（步骤名或从 1 开始的序号），否则根据
+        步骤引用的 ${build_dir} 文件推断：一个步骤产生的构建产物（忽略扩展名）被
+        另一个步骤引用时，后者依赖前者。没有引用任何构建产物的步骤被视为屏障，与前后所有
+        步骤都保持原有顺序。
+        """
+        names = {}
+        for i, step in enumerate(test.run_steps):
+            names.setdefault(step.get("name", step["command"]), i)
+
+        refs = [self._step_build_refs(step) for step in test.run_steps]
+        deps: List[Set[int]] = []
+        for j, step in enumerate(test.run_steps):
+            if "depends_on" in step:
+                explicit = set()
+                for dep in step["depends_on"]:
+                    if isinstance(dep, int):
+                        index = dep - 1
+                    elif dep in names:
+                        index = names[dep]
+                    else:
+                        raise ValueError(
+                            f"Step {j + 1} depends on unknown step {dep!r}"
+                        )
+                    if not 0 <= index < j:
+                        raise ValueError(
+                            f"Step {j + 1} can only depend on earlier steps, got {dep!r}"
+                        )
+                    explicit.add(index)
+                deps.append(explicit)
+                continue
+
+            deps.append({i for i in range(j) if self._steps_conflict(refs[i], refs[j])})
+        return deps
+
+    @staticmethod
+    def _steps_conflict(
+        a: Optional[Tuple[Set[str], Set[str]]], b: Optional[Tuple[Set[str], Set[str]]]
+    ) -> bool:
+        if a is None or b is None:
+            return True
+        # 只要一方产生的文件被另一方引用，两者就不能并行
+        return bool(a[0] & b[1] or b[0] & a[1])
+
+    def _step_build_refs(
+        self, step: Dict[str, Any]
+    ) -> Optional[Tuple[Set[str], Set[str]]]:
+        """返回步骤（产生的, 引用的）构建产物名（去掉扩展名），None 表示无法判断
+
+        引用的文件包括命令本身（例如 command = "${build_dir}/program"）和参数；
+        产生的文件包括 -o 之后的路径以及 check.files、check.artifacts 中列出的文件。
+        性能检查步骤和需要计时的步骤总是作为屏障单独运行，避免并行的步骤干扰计时。
+        """
+        if self._sample_repeat(step):
+            return None
+        args = [str(arg) for arg in step.get("args", [])]
+        check = step.get("check", {})
+        files = list(check.get("files", [])) + [
+            artifact["file"] for artifact in check.get("artifacts", [])
+        ]
+        outputs = [arg for prev, arg in zip([""] + args, args) if prev == "-o"] + [
+            arg[2:] for arg in args if arg.startswith("-o") and len(arg) > 2
+        ]
+
+        def names(values: List[str]) -> Optional[Set[str]]:
+            result = set()
+            for value in values:
+                if re.search(r"\$\{build_dir\}(?!/)", value):
+                    # 直接引用了整个构建目录
+                    return None
+                for match in re.finditer(r"\$\{build_dir\}/([^\s\"']+)", value):
+                    result.add(re.sub(r"\.[^./]*$", "", match.group(1)))
+            return result
+
+        referenced = names([str(step["command"])] + args + files)
+        produced = names(outputs + files)
+        if not referenced or produced is None:
+            return None
+        return produced, referenced
+
     def _execute_single_step(
         self, test: TestCase, step: Dict[str, Any], step_index: int
     ) -> TestResult:
@@ -610,30 +2831,114 @@ class TestRunner:
         ]
 
         try:
-            process = subprocess.run(
-                cmd + args,
-                cwd=test.path,
-                input=self._get_stdin_data(test, step),
-                capture_output=True,
-                text=True,
-                timeout=step.get("timeout", 5.0),
-            )
+            run_start = time.perf_counter()
+            process = self._run_step_process(test, step, step_index, cmd, args)
+            samples = None
+            repeat = self._sample_repeat(step)
+            if repeat and not self.no_check:
+                samples = [self._performance_sample(process, run_start)]
+                # 正确性只检查第一次运行的结果，其余运行只用于计时
+                for _ in range(repeat - 1):
+                    run_start = time.perf_counter()
+                    rerun = self._run_step_process(test, step, step_index, cmd, args)
+                    samples.append(self._performance_sample(rerun, run_start))
+                tool = Path(step["command"]).name
+                if tool in self.sample_tools:
+                    entry = {
+                        "name": step.get("name", step["command"]),
+                        "tool": tool,
+                        "wall_ms": [round(sample["wall_ms"], 3) for sample in samples],
+                    }
+                    if all(sample["cpu_ms"] is not None for sample in samples):
+                        entry["cpu_ms"] = [
+                            round(sample["cpu_ms"], 3) for sample in samples
+                        ]
+                    self.samples[(test.path.name, step_index)] = entry
 
             # 如果启用了详细输出模式
             if self.verbose and self.console and not isinstance(self.console, type):
-                self.console.print(f"[bold cyan]Step {step_index} Output:[/bold cyan]")
-                self.console.print("[bold]Command:[/bold]", " ".join(cmd + args))
-                if process.stdout:
-                    self.console.print("[bold]Standard Output:[/bold]")
-                    self.console.print(process.stdout)
-                if process.stderr:
-                    self.console.print("[bold]Standard Error:[/bold]")
-                    self.console.print(process.stderr)
-                self.console.print(f"[bold]Return Code:[/bold] {process.returncode}\n")
+                # 并行执行步骤时避免多个步骤的输出交错
+                with self._print_lock:
+                    self.console.print(
+                        f"[bold cyan]Step {step_index} Output:[/bold cyan]"
+                    )
+                    self.console.print("[bold]Command:[/bold]", " ".join(cmd + args))
+                    if process.stdout:
+                        self.console.print("[bold]Standard Output:[/bold]")
+                        self.console.print(process.stdout)
+                    if process.stderr:
+                        self.console.print("[bold]Standard Error:[/bold]")
+                        self.console.print(process.stderr)
+                    usage = getattr(process, "rusage", None)
+                    if usage is not None:
+                        max_rss = usage["max_rss_kb"]
+                        max_rss = (
+                            f"{max_rss / 1024:.1f} MiB"
+                            if max_rss is not None
+                            else "not measurable"
+                        )
+                        self.console.print(
+                            f"[bold]Resources:[/bold] user {usage['user_time']:.3f}s, "
+                            f"sys {usage['system_time']:.3f}s, max RSS {max_rss}"
+                        )
+                    self.console.print(
+                        f"[bold]Return Code:[/bold] {process.returncode}\n"
+                    )
 
         except subprocess.TimeoutExpired:
             return self._create_timeout_result(test, step, step_index, start_time)
 
+        performance = None
+        if samples is not None and self._is_performance_step(step):
+            performance = self.performance_checker.check(step, samples)
+        result = self._evaluate_step(
+            test, step, step_index, process, start_time, performance
+        )
+        usage = getattr(process, "rusage", None)
+        if usage is not None or performance is not None:
+            entry = {"step": step_index, "name": step.get("name", step["command"])}
+            entry.update(usage or {})
+            entry["wall_time"] = round(result.time, 4)
+            if performance is not None:
+                entry["performance"] = performance[3]
+            result.step_usage = [entry]
+        return result
+
+    @staticmethod
+    def _is_performance_step(step: Dict[str, Any]) -> bool:
+        return any(key in step.get("check", {}) for key in PERFORMANCE_CHECKS)
+
+    def _sample_repeat(self, step: Dict[str, Any]) -> int:
+        """步骤需要计时运行的次数，0 表示不计时"""
+        if self._is_performance_step(step):
+            return int(step["check"].get("repeat", 1))
+        if Path(step["command"]).name in self.sample_tools:
+            return max(1, self.sample_repeat)
+        return 0
+
+    @staticmethod
+    def _performance_sample(
+        process: subprocess.CompletedProcess, run_start: float
+    ) -> Dict[str, Any]:
+        usage = getattr(process, "rusage", None)
+        return {
+            "wall_ms": (time.perf_counter() - run_start) * 1000,
+            "cpu_ms": (usage["user_time"] + usage["system_time"]) * 1000
+            if usage
+            else None,
+            "max_rss_kb": usage["max_rss_kb"] if usage else None,
+        }
+
+    def _evaluate_step(
+        self,
+        test: TestCase,
+        step: Dict[str, Any],
+        step_index: int,
+        process: subprocess.CompletedProcess,
+        start_time: float,
+        performance: Optional[Tuple[bool, str, Optional[float], Dict[str, Any]]] = None,
+    ) -> TestResult:
+        """根据步骤的检查配置评判执行结果，performance 为 PerformanceChecker 的结果"""
         # 在no_check模式下，只要命令执行成功就认为通过
         if self.no_check:
             return self._create_success_result(
@@ -643,6 +2948,7 @@ class TestRunner:
                 start_time,
             )
 
+        score = None
         if "check" in step:
             success, message, score = self.checker.check(
                 step,
@@ -667,8 +2973,143 @@ class TestRunner:
                     else "",
                 )
 
+        if performance is not None:
+            success, message, perf_score, _ = performance
+            if not success:
+                return self._create_failure_result(
+                    test,
+                    step,
+                    step_index,
+                    message,
+                    start_time,
+                    process.stdout,
+                    process.stderr,
+                    process.returncode,
+                    "",
+                )
+            if perf_score is not None:
+                base = score if score is not None else step.get("score", 0)
+                score = min(base, perf_score)
+
         return self._create_success_result(test, step, score, start_time)
 
+    def _run_step_process(
+        self,
+        test: TestCase,
+        step: Dict[str, Any],
+        step_index: int,
+        cmd: List[str],
+        args: List[str],
+    ) -> subprocess.CompletedProcess:
+        """执行步骤命令，开启缓存时优先从缓存中恢复结果"""
+        stdin_data = self._get_stdin_data(test, step)
+        cache_key = None
+        if (
+            self.cache is not None
+            and not self._sample_repeat(step)
+            and step.get(
+                "cache", step["command"] in self.config.cache_config["commands"]
+            )
+        ):
+            cache_key = self._step_cache_key(test, cmd + args, stdin_data)
+            cached = self.cache.lookup(cache_key, test.path / "build", cmd + args)
+            if cached is not None:
+                return cached
+
+        output_limit = step.get(
+            "max_output",
+            self.config.grader_settings.get("max_output", DEFAULT_MAX_OUTPUT),
+        )
+        # 超出 max_output 的输出保存在构建目录下的 .stepN.stdout/.stepN.stderr
+        spill_prefix = test.path / "build" / f".step{step_index}"
+        if self.executor is not None:
+            process = self.executor.run(
+                cmd + args,
+                cwd=test.path,
+                input=stdin_data,
+                timeout=step.get("timeout", 5.0),
+                output_limit=output_limit,
+                spill_prefix=spill_prefix,
+            )
+        elif output_limit:
+            stdout_path = Path(f"{spill_prefix}.stdout")
+            stderr_path = Path(f"{spill_prefix}.stderr")
+            with open(stdout_path, "wb") as stdout, open(stderr_path, "wb") as stderr:
+                process = run_process(
+                    cmd + args,
+                    cwd=test.path,
+                    input=stdin_data,
+                    stdout=stdout,
+                    stderr=stderr,
+                    text=True,
+                    timeout=step.get("timeout", 5.0),
+                )
+            process.stdout = OutputCapture.from_file(stdout_path, output_limit)
+            process.stderr = OutputCapture.from_file(stderr_path, output_limit)
+        else:
+            process = run_process(
+                cmd + args,
+                cwd=test.path,
+                input=stdin_data,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=step.get("timeout", 5.0),
+            )
+
+        truncated = any(
+            getattr(output, "truncated", False)
+            for output in (process.stdout, process.stderr)
+        )
+        if cache_key is not None and not truncated:
+            outputs = self._step_outputs(test, step)
+            if outputs is not None:
+                self.cache.store(cache_key, process, outputs)
+        return process
+
+    def _step_cache_key(
+        self, test: TestCase, command: List[str], stdin_data: Optional[str]
+    ) -> str:
+        """根据命令行、引用的输入文件和工具二进制计算缓存键"""
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps(command).encode())
+        hasher.update((stdin_data or "").encode())
+
+        tool = (test.path / command[0]).resolve()
+        if tool.is_file():
+            hasher.update(file_digest(tool).encode())
+
+        inputs = set()
+        for arg in command[1:]:
+            candidate = test.path / (arg[2:] if arg.startswith("-I") else arg)
+            if candidate.is_dir() and arg.startswith("-I"):
+                # 头文件搜索目录中的文件都可能被包含
+                inputs.update(f for f in candidate.iterdir() if f.is_file())
+            elif candidate.is_file():
+                inputs.add(candidate)
+                if candidate.suffix in (".c", ".h", ".cpp", ".hpp"):
+                    # 源文件可能包含同目录下的头文件
+                    inputs.update(candidate.parent.glob("*.h"))
+
+        for path in sorted(inputs):
+            hasher.update(str(path).encode())
+            hasher.update(file_digest(path).encode())
+        return hasher.hexdigest()
+
+    def _step_outputs(
+        self, test: TestCase, step: Dict[str, Any]
+    ) -> Optional[List[Path]]:
+        """返回步骤产生的构建产物，无法确定时返回 None"""
+        refs = self._step_build_refs(step)
+        if refs is None or not refs[0]:
+            return None
+        build_dir = test.path / "build"
+        return sorted(
+            f
+            for f in build_dir.iterdir()
+            if f.is_file() and re.sub(r"\.[^.]*$", "", f.name) in refs[0]
+        )
+
     def _resolve_relative_path(self, path: str, cwd: Path = os.getcwd()) -> str:
         result = path
         if isinstance(path, Path):
@@ -775,8 +3216,12 @@ class TestRunner:
         }
         if stdout:
             error_details["stdout"] = stdout
+            if getattr(stdout, "truncated", False):
+                error_details["stdout_file"] = str(stdout.spill_path)
         if stderr:
             error_details["stderr"] = stderr
+            if getattr(stderr, "truncated", False):
+                error_details["stderr_file"] = str(stderr.spill_path)
         if return_code is not None:
             error_details["return_code"] = return_code
         if expected_output:
@@ -821,6 +3266,7 @@ class ResultFormatter(ABC):
         results: List[Dict[str, Any]],
         total_score: float,
         max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
     ) -> None:
         pass
 
@@ -832,19 +3278,26 @@ class JsonFormatter(ResultFormatter):
         results: List[Dict[str, Any]],
         total_score: float,
         max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
     ) -> None:
         json_result = {
             "total_score": round(total_score, 1),
             "max_score": round(max_score, 1),
-            "percentage": round(total_score / max_score * 100, 1),
+            "percentage": round(total_score / max_score * 100, 1)
+            if max_score > 0
+            else 0,
             "tests": results,
         }
+        if summary:
+            json_result["summary"] = summary
         print(json.dumps(json_result, ensure_ascii=False))
 
 
 class TableFormatter(ResultFormatter):
-    def __init__(self, console: Console):
+    def __init__(self, console: "Console", show_usage: bool = False):
         self.console = console
+        # 是否显示资源使用列（所有步骤的 CPU 时间之和、最大常驻内存的最大值）
+        self.show_usage = show_usage
 
     def format_results(
         self,
@@ -852,8 +3305,9 @@ class TableFormatter(ResultFormatter):
         results: List[Dict[str, Any]],
         total_score: float,
         max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
     ) -> None:
-        self._format_rich_table(test_cases, results, total_score, max_score)
+        self._format_rich_table(test_cases, results, total_score, max_score, summary)
 
     def _format_rich_table(
         self,
@@ -861,12 +3315,18 @@ class TableFormatter(ResultFormatter):
         results: List[Dict[str, Any]],
         total_score: float,
         max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
     ) -> None:
+        from rich.table import Table
+
         table = Table(show_header=True, header_style="bold")
         table.add_column("Test Case", style="cyan")
         table.add_column("Result", justify="center")
         table.add_column("Time", justify="right")
         table.add_column("Score", justify="right")
+        if self.show_usage:
+            table.add_column("CPU", justify="right")
+            table.add_column("Max RSS", justify="right")
         table.add_column("Message")
 
         status_style = {
@@ -876,16 +3336,27 @@ class TableFormatter(ResultFormatter):
         }
 
         for test, result in zip(test_cases, results):
+            usage_cells = []
+            if self.show_usage:
+                usage = result.get("step_usage") or []
+                # 低于评分器自身峰值内存的步骤无法测量最大常驻内存
+                rss = [u["max_rss_kb"] for u in usage if u["max_rss_kb"] is not None]
+                cpu = sum(u["user_time"] + u["system_time"] for u in usage)
+                usage_cells = [
+                    f"{cpu:.2f}s" if usage else "-",
+                    f"{max(rss) / 1024:.1f}M" if rss else "-",
+                ]
             table.add_row(
                 test.meta["name"],
                 status_style[result["status"]],
                 f"{result['time']:.2f}s",
                 f"{result['score']:.1f}/{result['max_score']:.1f}",
+                *usage_cells,
                 result["message"],
             )
 
         self.console.print(table)
-        self._print_summary(total_score, max_score)
+        self._print_summary(total_score, max_score, summary)
 
     def _format_basic_table(
         self,
@@ -893,6 +3364,7 @@ class TableFormatter(ResultFormatter):
         results: List[Dict[str, Any]],
         total_score: float,
         max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
     ) -> None:
         # 定义列宽
         col_widths = {
@@ -936,26 +3408,65 @@ class TableFormatter(ResultFormatter):
             self.console.print(row)
 
         self.console.print("-" * len(header))
-        self._print_basic_summary(total_score, max_score)
+        self._print_basic_summary(total_score, max_score, summary)
 
-    def _print_summary(self, total_score: float, max_score: float) -> None:
-        summary = Panel(
+    def _print_summary(
+        self,
+        total_score: float,
+        max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        lines = [
             f"[bold]Total Score: {total_score:.1f}/{max_score:.1f} "
-            f"({total_score / max_score * 100:.1f}%)[/bold]",
+            f"({total_score / max_score * 100 if max_score > 0 else 0:.1f}%)[/bold]"
+        ]
+        lines.extend(self._format_summary_lines(summary))
+        from rich.panel import Panel
+
+        summary_panel = Panel(
+            "\n".join(lines),
             border_style="green" if total_score == max_score else "yellow",
         )
         self.console.print()
-        self.console.print(summary)
+        self.console.print(summary_panel)
         self.console.print()
 
-    def _print_basic_summary(self, total_score: float, max_score: float) -> None:
+    def _print_basic_summary(
+        self,
+        total_score: float,
+        max_score: float,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> None:
         self.console.print()
         self.console.print(
             f"Total Score: {total_score:.1f}/{max_score:.1f} "
-            f"({total_score / max_score * 100:.1f}%)"
+            f"({total_score / max_score * 100 if max_score > 0 else 0:.1f}%)"
         )
+        for line in self._format_summary_lines(summary):
+            self.console.print(line)
         self.console.print()
 
+    def _format_summary_lines(self, summary: Optional[Dict[str, Any]]) -> List[str]:
+        """把附加统计（如缓存命中情况）格式化为 "Step cache: 3 hits, 1 misses" 形式"""
+        lines = []
+        for key, value in (summary or {}).items():
+            label = key.replace("_", " ").capitalize()
+            if key == "setup":
+                value = (
+                    f"{value['ran']} ran in {value['run_s']:.2f}s, "
+                    f"{value['skipped']} skipped (saved ~{value['saved_s']:.2f}s)"
+                )
+            elif key == "shard":
+                value = (
+                    f"{value['index']}/{value['count']} ({len(value['tests'])} tests)"
+                )
+            elif isinstance(value, dict):
+                value = ", ".join(
+                    f"{v} {k.replace('_', ' ')}" for k, v in value.items()
+                )
+            lines.append(f"{label}: {value}")
+        return lines
+
 
 class VSCodeConfigGenerator:
     """Generate and manage VS Code debug configurations"""
@@ -1182,27 +3693,88 @@ class Grader:
         no_check=False,
         generate_vscode=False,
         vscode_no_merge=False,
+        jobs=1,
+        step_jobs=1,
+        use_cache=False,
+        changed_only=False,
+        engine="subprocess",
+        max_procs=None,
+        show_usage=False,
+        shard=None,
+        order="canonical",
     ):
         self.config = Config(Path.cwd())
+        if RusagePopen.launcher_dir is None:
+            RusagePopen.launcher_dir = (
+                self.config.project_root / self.config.cache_config["dir"]
+            )
         self.verbose = verbose
         self.json_output = json_output
         self.dry_run = dry_run
         self.no_check = no_check
         self.generate_vscode = generate_vscode
         self.vscode_no_merge = vscode_no_merge
-        self.console = Console(quiet=json_output)
+        # 并行运行测试点的最大数量（dry-run 模式只运行单个测试点）
+        self.jobs = 1 if dry_run else max(1, jobs or 1)
+        self.console = create_console(quiet=json_output)
+        self.cache = None
+        if use_cache and not dry_run:
+            cache_config = self.config.cache_config
+            self.cache = StepCache(
+                self.config.project_root / cache_config["dir"],
+                int(cache_config["max_size_mb"] * 1024 * 1024),
+            )
+            self.cache.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = (
+            AsyncProcessExecutor(max_procs or os.cpu_count() or 1)
+            if engine == "asyncio"
+            else None
+        )
         self.runner = TestRunner(
             self.config,
             self.console,
             verbose=self.verbose,
             dry_run=self.dry_run,
             no_check=self.no_check,
+            step_jobs=step_jobs,
+            cache=self.cache,
+            executor=self.executor,
         )
         self.formatter = (
-            JsonFormatter() if json_output else TableFormatter(self.console)
+            JsonFormatter()
+            if json_output
+            else TableFormatter(self.console, show_usage=show_usage)
         )
         self.results: Dict[str, TestResult] = {}
+        self.changed_only = changed_only
+        self.fingerprinter = TestFingerprinter(self.config)
+        self.fingerprint_file = self.config.project_root / ".test_fingerprints"
+        self.result_store = ResultStore(
+            self.config.project_root / ResultStore.FILE,
+            self.config.history_config["retention"],
+            legacy_file=self.config.project_root / ".test_history",
+        )
+        self.setup_cache = SetupStepCache(
+            self.config.project_root, self.config.project_root / ".setup_state"
+        )
+        # 本次运行准备步骤的统计：实际运行和跳过的步骤数、运行耗时和跳过节省的耗时
+        self._setup_stats: Optional[Dict[str, Any]] = None
+        # 在后台运行的准备步骤，以及需要等待它们的测试点
+        self._pending_setup: List[Dict[str, Any]] = []
+        self._setup_thread: Optional[threading.Thread] = None
+        self._fingerprints: Dict[str, str] = {}
+        self._changed_stats: Optional[Dict[str, int]] = None
         self.vscode_generator = VSCodeConfigGenerator(Path.cwd(), self.config)
+        self.test_index = TestCaseIndex(
+            self.config.paths["cases_dir"], self.config.project_root / ".test_index"
+        )
+        self.test_cases: List[TestCase] = []
+        # (i, N)：只运行 N 个分片中的第 i 个（从 1 开始）
+        self.shard: Optional[Tuple[int, int]] = shard
+        # 分片前选中的全部测试目录名，merge 据此检查各分片的并集是否完整
+        self._selected_tests: List[str] = []
+        # 测试点的执行顺序，见 _execution_order
+        self.order = order
 
     def _save_test_history(
         self,
@@ -1211,7 +3783,7 @@ class Grader:
         total_score: float,
         max_score: float,
     ) -> None:
-        """保存测试历史到隐藏文件"""
+        """把本次运行追加到测试历史记录"""
         history_data = {
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
             "total_score": round(total_score, 1),
@@ -1221,6 +3793,8 @@ class Grader:
             else 0,
             "tests": [],
         }
+        if self.shard is not None:
+            history_data["shard"] = f"{self.shard[0]}/{self.shard[1]}"
 
         for test, result in zip(test_cases, test_results):
             test_data = {
@@ -1234,6 +3808,7 @@ class Grader:
                 "time": result["time"],
                 "message": result["message"],
                 "step_scores": result["step_scores"],
+                "step_usage": result.get("step_usage"),
             }
 
             # 如果测试失败，添加详细的错误信息
@@ -1245,10 +3820,9 @@ class Grader:
                     "error_message": error_details["error_message"],
                     "command": error_details.get("command", ""),  # 添加实际运行的命令
                 }
-                if "stdout" in error_details:
-                    test_data["error_details"]["stdout"] = error_details["stdout"]
-                if "stderr" in error_details:
-                    test_data["error_details"]["stderr"] = error_details["stderr"]
+                for key in ("stdout", "stderr", "stdout_file", "stderr_file"):
+                    if key in error_details:
+                        test_data["error_details"][key] = error_details[key]
                 if "return_code" in error_details:
                     test_data["error_details"]["return_code"] = error_details[
                         "return_code"
@@ -1257,23 +3831,7 @@ class Grader:
             history_data["tests"].append(test_data)
 
         try:
-            # 读取现有历史记录（如果存在）
-            history_file = Path(".test_history")
-            if history_file.exists():
-                with open(history_file, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-                # 限制历史记录数量为最近10次
-                history = history[-9:]
-            else:
-                history = []
-
-            # 添加新的测试记录
-            history.append(history_data)
-
-            # 保存更新后的历史记录
-            with open(history_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-
+            self.result_store.record_run(history_data)
         except Exception as e:
             if not self.json_output:
                 self.console.print(
@@ -1325,13 +3883,10 @@ class Grader:
     ) -> List[Tuple[TestCase, Dict[str, Any], Dict[str, Any]]]:
         """收集所有失败的测试步骤"""
         failed_steps = []
+        test_cases = {test.path.name: test for test in self.test_cases}
         for test_name, result in self.results.items():
             if not result.success and result.error_details:
-                test_case = next(
-                    test
-                    for test in self._load_test_cases()
-                    if test.path.name == test_name
-                )
+                test_case = test_cases[test_name]
                 # 处理所有失败步骤的错误信息
                 error_details_list = (
                     result.error_details
@@ -1382,12 +3937,16 @@ class Grader:
         specific_paths: Optional[List[Path]] = None,
     ):
         try:
-            if not self._run_setup_steps():
-                sys.exit(1)
-
             test_cases = self._load_test_cases(
                 specific_test, prefix_match, group, specific_paths
             )
+            if self.shard is not None:
+                self._selected_tests = [test.path.name for test in test_cases]
+                test_cases = self._select_shard(test_cases)
+            self.test_cases = test_cases
+            if not self._run_setup_steps(test_cases):
+                sys.exit(1)
+            self.test_index.save()
             if not self.json_output:
                 if self.dry_run:
                     self.console.print(
@@ -1407,49 +3966,32 @@ class Grader:
                         f"\n[bold]Running {len(test_cases)} test cases...[/bold]\n"
                     )
 
+            finished = {
+                test.path: result for test, result in self._run_test_cases(test_cases)
+            }
+            if self._setup_thread is not None:
+                self._setup_thread.join()
+
+            # 结果总是按原始顺序报告和记录，与执行顺序无关
             total_score = 0
             max_score = 0
             test_results = []
-
             for test in test_cases:
-                try:
-                    result = self.runner.run_test(test)
-                except Exception as e:
-                    if not self.json_output:
-                        self.console.print(
-                            f"[red]Error:[/red] Grader script error while running test '{test.meta['name']}': {str(e)}"
-                        )
-                    else:
-                        print(
-                            f"Error: Grader script error while running test '{test.meta['name']}': {str(e)}",
-                            file=sys.stderr,
-                        )
-                    sys.exit(1)
-
+                result = finished[test.path]
                 self.results[test.path.name] = result
-                result_dict = {
-                    "name": test.meta["name"],
-                    "success": result.success,
-                    "status": result.status,
-                    "time": round(result.time, 2),
-                    "score": result.score,
-                    "max_score": result.max_score,
-                    "step_scores": result.step_scores,
-                    "message": result.message,
-                    "error_details": result.error_details,
-                }
-                test_results.append(result_dict)
+                test_results.append(self._result_dict(test, result))
                 total_score += result.score
                 max_score += result.max_score
 
             if not self.dry_run:
                 self.formatter.format_results(
-                    test_cases, test_results, total_score, max_score
+                    test_cases, test_results, total_score, max_score, self._summary()
                 )
 
                 self._save_test_history(
                     test_cases, test_results, total_score, max_score
                 )
+                self._save_fingerprints(test_cases, test_results)
 
                 # 在所有测试完成后生成调试配置
                 self._generate_debug_configs()
@@ -1465,23 +4007,373 @@ class Grader:
                 print(f"Error: Grader script error: {str(e)}", file=sys.stderr)
             sys.exit(1)
 
-    def _run_setup_steps(self) -> bool:
-        if not self.config.setup_steps:
+    @staticmethod
+    def _result_dict(test: TestCase, result: TestResult) -> Dict[str, Any]:
+        """格式化输出和历史记录使用的单个测试点结果"""
+        return {
+            "name": test.meta["name"],
+            "success": result.success,
+            "status": result.status,
+            "time": round(result.time, 2),
+            "score": result.score,
+            "max_score": result.max_score,
+            "step_scores": result.step_scores,
+            "message": result.message,
+            "error_details": result.error_details,
+            "step_usage": result.step_usage,
+        }
+
+    def _summary(self) -> Dict[str, Any]:
+        """汇总附加统计信息，显示在结果表格下方或 JSON 输出中"""
+        summary = {}
+        if self.cache is not None:
+            summary["step_cache"] = self.cache.summary()
+        if self._changed_stats is not None:
+            summary["changed_mode"] = self._changed_stats
+        if self._setup_stats is not None:
+            summary["setup"] = self._setup_stats
+        if self.shard is not None:
+            # 记录分片包含的测试目录和分片前选中的全部测试目录，
+            # grader.py merge 据此检查覆盖情况并恢复原始顺序
+            summary["shard"] = {
+                "index": self.shard[0],
+                "count": self.shard[1],
+                "tests": [test.path.name for test in self.test_cases],
+                "selected": self._selected_tests,
+            }
+        return summary
+
+    def _select_shard(self, test_cases: List[TestCase]) -> List[TestCase]:
+        """按测试历史记录中的耗时把测试点分成 N 片，返回第 i 片
+
+        使用最长处理时间优先（LPT）的装箱：按耗时从长到短依次放入当前总耗时最小的
+        分片。没有历史记录的测试点按已知耗时的平均值估计。相同的测试点集合和历史
+        记录总是得到相同的划分，因此各分片进程不需要互相协调，但需要使用同一份
+        历史记录（.test_results.db）。
+        """
+        import heapq
+
+        index, count = self.shard
+        durations = self._historical_durations()
+        default = sum(durations.values()) / len(durations) if durations else 1.0
+        order = sorted(
+            range(len(test_cases)),
+            key=lambda i: (-durations.get(test_cases[i].path.name, default), i),
+        )
+        shards: List[List[int]] = [[] for _ in range(count)]
+        loads = [(0.0, shard) for shard in range(count)]
+        for i in order:
+            load, shard = heapq.heappop(loads)
+            shards[shard].append(i)
+            heapq.heappush(
+                loads, (load + durations.get(test_cases[i].path.name, default), shard)
+            )
+        return [test_cases[i] for i in sorted(shards[index - 1])]
+
+    def _historical_durations(self) -> Dict[str, float]:
+        """每个测试目录最近一次运行的耗时（秒），见 ResultStore.durations"""
+        try:
+            return self.result_store.durations()
+        except Exception:
+            return {}
+
+    def _run_test_cases(
+        self, test_cases: List[TestCase]
+    ) -> Iterator[Tuple[TestCase, TestResult]]:
+        """按执行顺序（见 _execution_order）依次产出每个测试点的结果
+
+        --changed 模式下，输入指纹与上次通过时相同的测试点直接报告为缓存通过。
+        只有 --changed 和 --order recent-change 需要输入指纹，其余情况不计算。
+        """
+        if (
+            not self.dry_run
+            and not self.no_check
+            and (self.changed_only or self.order == "recent-change")
+        ):
+            self._fingerprints = {
+                str(test.path): self.fingerprinter.compute(test) for test in test_cases
+            }
+        cached = self._cached_passes(test_cases) if self.changed_only else {}
+        ordered = self._execution_order(test_cases)
+        executed = self._execute_test_cases(
+            [test for test in ordered if str(test.path) not in cached]
+        )
+        for test in ordered:
+            if str(test.path) in cached:
+                self.console.print(
+                    f"{TestRunner.STATUS_ICONS['PASS']} {test.meta['name']}: "
+                    "[green]Cached[/green]"
+                )
+                yield test, cached[str(test.path)]
+            else:
+                yield next(executed)
+
+    def _execution_order(self, test_cases: List[TestCase]) -> List[TestCase]:
+        """--order 指定的测试点执行顺序
+
+        - canonical：原始顺序
+        - lpt：历史耗时最长的先运行，并行运行时缩短总耗时
+        - failed-first：上次未通过（或没有记录）的测试点先运行
+        - recent-change：输入指纹与上次通过时不同（或上次未通过）的测试点先运行
+
+        后两种策略在同一类测试点中也按历史耗时从长到短排列。耗时和状态来自测试
+        历史记录；没有耗时记录的测试点按已知耗时的平均值估计。
+        """
+        if self.order == "canonical" or len(test_cases) <= 1:
+            return test_cases
+        durations = self._historical_durations()
+        default = sum(durations.values()) / len(durations) if durations else 0.0
+
+        def duration(test: TestCase) -> float:
+            return durations.get(test.path.name, default)
+
+        if self.order == "failed-first":
+            try:
+                statuses = self.result_store.statuses()
+            except Exception:
+                statuses = {}
+            first = {
+                test.path
+                for test in test_cases
+                if statuses.get(test.path.name) != "PASS"
+            }
+        elif self.order == "recent-change":
+            records = self._load_fingerprints()
+            first = {
+                test.path
+                for test in test_cases
+                if records.get(str(test.path), {}).get("fingerprint")
+                != self._fingerprints.get(str(test.path))
+            }
+        else:
+            first = set()
+        return sorted(
+            test_cases, key=lambda test: (test.path not in first, -duration(test))
+        )
+
+    def _cached_passes(self, test_cases: List[TestCase]) -> Dict[str, TestResult]:
+        records = self._load_fingerprints()
+        cached = {}
+        for test in test_cases:
+            record = records.get(str(test.path))
+            if record and record["fingerprint"] == self._fingerprints[str(test.path)]:
+                cached[str(test.path)] = TestResult(
+                    success=True,
+                    message="Cached pass (inputs unchanged)",
+                    time=0.0,
+                    score=record["score"],
+                    max_score=record["max_score"],
+                    step_scores=record.get("step_scores"),
+                )
+        self._changed_stats = {
+            "cached": len(cached),
+            "run": len(test_cases) - len(cached),
+        }
+        return cached
+
+    def _load_fingerprints(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.fingerprint_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_fingerprints(
+        self, test_cases: List[TestCase], test_results: List[Dict[str, Any]]
+    ) -> None:
+        """记录通过的测试点的输入指纹，未通过的测试点清除记录
+
+        没有计算指纹时（不需要指纹的运行）只清除未通过的测试点的记录，
+        记录文件不存在或没有需要清除的记录时不写入。
+        """
+        if not self._fingerprints and not self.fingerprint_file.exists():
+            return
+        records = self._load_fingerprints()
+        count = len(records)
+        for test, result in zip(test_cases, test_results):
+            key = str(test.path)
+            if key not in self._fingerprints:
+                if result["status"] != "PASS":
+                    records.pop(key, None)
+            elif result["status"] == "PASS":
+                records[key] = {
+                    "fingerprint": self._fingerprints[key],
+                    "score": result["score"],
+                    "max_score": result["max_score"],
+                    "step_scores": result["step_scores"],
+                }
+            else:
+                records.pop(key, None)
+        if not self._fingerprints and len(records) == count:
+            return
+        try:
+            with open(self.fingerprint_file, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            if not self.json_output:
+                self.console.print(
+                    f"[yellow]Warning:[/yellow] Failed to save test fingerprints: {str(e)}"
+                )
+
+    def _execute_test_cases(
+        self, test_cases: List[TestCase]
+    ) -> Iterator[Tuple[TestCase, TestResult]]:
+        """按给定顺序依次产出每个测试点的结果，jobs > 1 时在线程池中并行执行"""
+        if self.jobs <= 1 or len(test_cases) <= 1:
+            for test in test_cases:
+                try:
+                    result = self._run_test(self.runner, test)
+                except Exception as e:
+                    self._abort_on_test_error(test, e)
+                yield test, result
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [
+                executor.submit(self._run_test_buffered, test) for test in test_cases
+            ]
+            # 按提交顺序收集结果，保证输出和历史记录的顺序与串行运行一致
+            for test, future in zip(test_cases, futures):
+                try:
+                    result, output = future.result()
+                except Exception as e:
+                    for pending in futures:
+                        pending.cancel()
+                    self._abort_on_test_error(test, e)
+                if output:
+                    self.console.file.write(output)
+                    self.console.file.flush()
+                yield test, result
+
+    def _run_test_buffered(self, test: TestCase) -> Tuple[TestResult, str]:
+        """在工作线程中运行单个测试点，并把控制台输出缓存起来避免交错"""
+        runner = copy.copy(self.runner)
+        if self.console.quiet:
+            runner.console = self.console
+            return self._run_test(runner, test), ""
+        buffer = io.StringIO()
+        runner.console = create_console(
+            file=buffer,
+            force_terminal=self.console.is_terminal,
+            color_system=self.console.color_system,
+            width=self.console.width,
+        )
+        runner.show_progress = False
+        result = self._run_test(runner, test)
+        return result, buffer.getvalue()
+
+    def _run_test(self, runner: TestRunner, test: TestCase) -> TestResult:
+        """等待测试点需要的后台准备步骤完成后运行测试点"""
+        for entry in self._pending_setup:
+            if str(test.path) not in entry["tests"]:
+                continue
+            entry["done"].wait()
+            if not entry["success"]:
+                return TestResult(
+                    success=False,
+                    message=f"Setup step '{entry['step']['name']}' failed",
+                    time=0.0,
+                    score=0,
+                    max_score=test.meta["score"],
+                )
+        return runner.run_test(test)
+
+    def _abort_on_test_error(self, test: TestCase, e: Exception) -> None:
+        if not self.json_output:
+            self.console.print(
+                f"[red]Error:[/red] Grader script error while running test '{test.meta['name']}': {str(e)}"
+            )
+        else:
+            print(
+                f"Error: Grader script error while running test '{test.meta['name']}': {str(e)}",
+                file=sys.stderr,
+            )
+        sys.exit(1)
+
+    def _run_setup_steps(self, test_cases: Optional[List[TestCase]] = None) -> bool:
+        """运行准备步骤
+
+        不指定 test_cases 时运行全部步骤。指定时只运行这些测试点需要的步骤
+        （见 _setup_step_needed）：开头连续的、所有测试点都需要的步骤在前台运行，
+        之后的步骤在后台线程中按顺序运行，每个测试点只等待自己需要的步骤
+        （见 _run_test），不必等全部准备步骤完成。
+        """
+        self._pending_setup = []
+        self._setup_thread = None
+        steps = self.config.setup_steps
+        if not steps:
+            return True
+        self._setup_stats = {"ran": 0, "skipped": 0, "run_s": 0.0, "saved_s": 0.0}
+        if test_cases is None:
+            return self._run_foreground_setup(steps)
+
+        needed = [
+            [test for test in test_cases if self._setup_step_needed(step, test)]
+            for step in steps
+        ]
+        split = 0
+        while split < len(steps) and len(needed[split]) in (0, len(test_cases)):
+            split += 1
+        foreground = [step for step, tests in zip(steps[:split], needed) if tests]
+        if not self._run_foreground_setup(foreground):
+            return False
+
+        self._pending_setup = [
+            {
+                "step": step,
+                "tests": {str(test.path) for test in tests},
+                "done": threading.Event(),
+                "success": False,
+            }
+            for step, tests in zip(steps[split:], needed[split:])
+            if tests
+        ]
+        if self._pending_setup:
+            self._setup_thread = threading.Thread(
+                target=self._run_background_setup, daemon=True
+            )
+            self._setup_thread.start()
+        return True
+
+    def _setup_step_needed(self, step: Dict[str, Any], test: TestCase) -> bool:
+        """步骤没有声明 groups 或 tests 时所有测试点都需要，否则只有列出的测试点需要"""
+        if "groups" not in step and "tests" not in step:
+            return True
+        test_ids = list(step.get("tests", []))
+        for group in step.get("groups", []):
+            test_ids.extend(self.config.groups.get(group, []))
+        return any(matches_test_id(test, test_id) for test_id in test_ids)
+
+    def _run_background_setup(self) -> None:
+        # 后面的步骤可能依赖前面的步骤，一旦失败，其余步骤都视为失败
+        failed = False
+        for entry in self._pending_setup:
+            if not failed:
+                entry["success"] = self._run_setup_step(entry["step"])
+                failed = not entry["success"]
+            entry["done"].set()
+
+    def _run_foreground_setup(self, steps: List[Dict[str, Any]]) -> bool:
+        if not steps:
             return True
 
         if self.console and not isinstance(self.console, type):
+            from rich.progress import Progress, SpinnerColumn, TextColumn
+
             with Progress(
                 SpinnerColumn(),
                 TextColumn("[progress.description]{task.description}"),
                 console=self.console,
             ) as progress:
-                total_steps = len(self.config.setup_steps)
+                total_steps = len(steps)
                 task = progress.add_task(
                     f"Running setup steps [0/{total_steps}]...",
                     total=total_steps,
                 )
 
-                for i, step in enumerate(self.config.setup_steps, 1):
+                for i, step in enumerate(steps, 1):
                     step_name = step.get("message", "Setup step")
                     progress.update(
                         task,
@@ -1500,12 +4392,21 @@ class Grader:
                     )
                 return True
         else:
-            for step in self.config.setup_steps:
+            for step in steps:
                 if not self._run_setup_step(step):
                     return False
             return True
 
     def _run_setup_step(self, step: Dict[str, Any]) -> bool:
+        stats = self._setup_stats
+        if self.setup_cache.fresh(step):
+            stats["skipped"] += 1
+            stats["saved_s"] = round(
+                stats["saved_s"] + self.setup_cache.saved_time(step), 3
+            )
+            return True
+
+        start_time = time.perf_counter()
         try:
             if step["type"] != "command":
                 if not self.json_output:
@@ -1529,12 +4430,16 @@ class Grader:
                 timeout=step.get("timeout", 5.0),
             )
 
+            duration = time.perf_counter() - start_time
+            stats["ran"] += 1
+            stats["run_s"] = round(stats["run_s"] + duration, 3)
             if process.returncode != 0:
                 if not self.json_output:
                     self.console.print("[red]Error:[/red] Command failed:")
                     self.console.print(process.stderr)
                 return False
 
+            self.setup_cache.record(step, duration)
             return True
 
         except Exception as e:
@@ -1630,17 +4535,16 @@ class Grader:
         if specific_test:
             # 获取所有匹配的测试目录
             matching_tests = []
-            for test_dir in self.config.paths["cases_dir"].iterdir():
-                if test_dir.is_dir() and (test_dir / "config.toml").exists():
-                    if prefix_match and specific_test.isdigit():
-                        # 使用数字前缀精确匹配模式
-                        prefix_match = re.match(r"^(\d+)", test_dir.name)
-                        if prefix_match and prefix_match.group(1) == specific_test:
-                            matching_tests.append(test_dir)
-                    else:
-                        # 使用常规的开头匹配
-                        if test_dir.name.lower().startswith(specific_test.lower()):
-                            matching_tests.append(test_dir)
+            for test_dir in self.test_index.directories():
+                if prefix_match and specific_test.isdigit():
+                    # 使用数字前缀精确匹配模式
+                    prefix_match = re.match(r"^(\d+)", test_dir.name)
+                    if prefix_match and prefix_match.group(1) == specific_test:
+                        matching_tests.append(test_dir)
+                else:
+                    # 使用常规的开头匹配
+                    if test_dir.name.lower().startswith(specific_test.lower()):
+                        matching_tests.append(test_dir)
 
             if not matching_tests:
                 if not self.json_output:
@@ -1668,9 +4572,9 @@ class Grader:
                     )
                     self.console.print(message)
                     for test_dir in matching_tests:
-                        config = tomli.load(open(test_dir / "config.toml", "rb"))
+                        test_case = self._load_single_test(test_dir)
                         self.console.print(
-                            f"  - {test_dir.name}: {config['meta']['name']}"
+                            f"  - {test_dir.name}: {test_case.meta['name']}"
                         )
                     self.console.print(
                         "Please be more specific in your test case name."
@@ -1684,74 +4588,1724 @@ class Grader:
                     print(message, file=sys.stderr)
                 sys.exit(1)
 
-            return [self._load_single_test(matching_tests[0])]
+            return [self._load_single_test(matching_tests[0])]
+
+        if not self.config.paths["cases_dir"].exists():
+            if not self.json_output:
+                self.console.print("[red]Error:[/red] tests/cases directory not found")
+            else:
+                print("Error: tests/cases directory not found", file=sys.stderr)
+            sys.exit(1)
+
+        test_cases = [
+            self._load_single_test(test_dir)
+            for test_dir in self.test_index.directories()
+        ]
+
+        if not test_cases:
+            if not self.json_output:
+                self.console.print(
+                    "[red]Error:[/red] No test cases found in tests/cases/"
+                )
+            else:
+                print("Error: No test cases found in tests/cases/", file=sys.stderr)
+            sys.exit(1)
+
+        return test_cases
+
+    def _load_single_test(self, test_path: Path) -> TestCase:
+        try:
+            return self.test_index.load(test_path)
+        except Exception as e:
+            if not self.json_output:
+                self.console.print(
+                    f"[red]Error:[/red] Failed to load test '{test_path.name}': {str(e)}"
+                )
+            else:
+                print(
+                    f"Error: Failed to load test '{test_path.name}': {str(e)}",
+                    file=sys.stderr,
+                )
+            sys.exit(1)
+
+
+class WatchSession:
+    """--watch：常驻运行，监视源文件和测试目录，只重新运行受影响的分组
+
+    每隔 [watch].interval 秒扫描一次 [watch].paths 中文件的 (mtime, 大小)。
+    cases_dir 以外的文件（工具源码、头文件、公共目录）变化时先重新运行准备步骤；
+    然后用 TestFingerprinter 重新计算各测试点的指纹，指纹变化的测试点所在的
+    [groups] 分组整体重新运行（不属于任何分组的测试点单独运行），其余测试点沿用
+    上一次的结果，结果表格每次刷新。评分器进程、已解析的测试点索引和常驻特判
+    进程在多次运行之间复用。与普通运行一样，可以用测试名、--prefix 和 --group
+    限定只监视其中一部分测试点。
+    """
+
+    def __init__(
+        self,
+        grader: Grader,
+        specific_test: Optional[str] = None,
+        prefix_match: bool = False,
+        group: Optional[str] = None,
+    ):
+        self.grader = grader
+        self.specific_test = specific_test
+        self.prefix_match = prefix_match
+        self.group = group
+        config = grader.config
+        watch_config = config.watch_config
+        # 与 cases_dir 一样解析符号链接，快照中的路径才能与之比较
+        self.paths = [
+            (config.project_root / path).resolve() for path in watch_config["paths"]
+        ]
+        self.ignore = list(watch_config["ignore"])
+        self.interval = float(watch_config["interval"])
+        self.cases_dir = config.paths["cases_dir"].resolve()
+        # 测试目录 -> 最近一次运行的结果和运行时的指纹
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.fingerprints: Dict[str, str] = {}
+
+    def run(self) -> None:
+        console = self.grader.console
+        snapshot = self._snapshot()
+        setup_ok = self.grader._run_setup_steps()
+        if setup_ok:
+            snapshot = self._snapshot()
+            self._run_tests(None)
+        self._print_status(setup_ok)
+        try:
+            while True:
+                time.sleep(self.interval)
+                current = self._snapshot()
+                if current == snapshot:
+                    continue
+                # 等待文件稳定下来（编辑器保存时可能连续写入多个文件）
+                while True:
+                    time.sleep(self.interval)
+                    settled = self._snapshot()
+                    if settled == current:
+                        break
+                    current = settled
+                changed = [
+                    path
+                    for path in set(snapshot) | set(current)
+                    if snapshot.get(path) != current.get(path)
+                ]
+                snapshot = current
+
+                if not setup_ok or any(
+                    self.cases_dir not in Path(path).parents for path in changed
+                ):
+                    console.print("\n[bold]Sources changed, rebuilding...[/bold]")
+                    setup_ok = self.grader._run_setup_steps()
+                    # 准备步骤生成的文件不应再次触发运行
+                    snapshot = self._snapshot()
+                if setup_ok:
+                    self._run_tests(changed)
+                self._print_status(setup_ok)
+        except KeyboardInterrupt:
+            console.print("\nStopped watching.")
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """被监视文件的 (mtime_ns, 大小)，忽略与 [watch].ignore 匹配的文件和目录"""
+        import fnmatch
+
+        def ignored(name: str) -> bool:
+            return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+        snapshot = {}
+        for root in self.paths:
+            if root.is_file():
+                stat = root.stat()
+                snapshot[str(root)] = (stat.st_mtime_ns, stat.st_size)
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [name for name in dirnames if not ignored(name)]
+                for name in filenames:
+                    if ignored(name):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _run_tests(self, changed: Optional[List[str]]) -> None:
+        """changed 为 None 时运行全部测试点，否则只运行受影响的分组"""
+        grader = self.grader
+        test_cases = grader._load_test_cases(
+            self.specific_test, self.prefix_match, self.group
+        )
+        grader.test_index.save()
+        fingerprints = {
+            str(test.path): grader.fingerprinter.compute(test) for test in test_cases
+        }
+        if changed is None:
+            selected = test_cases
+        else:
+            affected = {
+                key
+                for key, fingerprint in fingerprints.items()
+                if self.fingerprints.get(key) != fingerprint
+            }
+            selected = self._expand_groups(test_cases, affected)
+        if not selected:
+            return
+
+        grader.console.print(
+            f"\n[bold]Running {len(selected)} affected test cases...[/bold]\n"
+        )
+        for test, result in grader._run_test_cases(selected):
+            self.results[str(test.path)] = grader._result_dict(test, result)
+            self.fingerprints[str(test.path)] = fingerprints[str(test.path)]
+        grader._fingerprints = fingerprints
+        grader._save_fingerprints(
+            selected, [self.results[str(test.path)] for test in selected]
+        )
+
+        # 刷新结果表格：未重新运行的测试点显示上一次的结果
+        shown = [test for test in test_cases if str(test.path) in self.results]
+        results = [self.results[str(test.path)] for test in shown]
+        total_score = sum(result["score"] for result in results)
+        max_score = sum(result["max_score"] for result in results)
+        grader.console.clear()
+        grader.formatter.format_results(
+            shown, results, total_score, max_score, grader._summary()
+        )
+        grader._save_test_history(shown, results, total_score, max_score)
+
+    def _expand_groups(
+        self, test_cases: List[TestCase], affected: Set[str]
+    ) -> List[TestCase]:
+        """把受影响的测试点扩展为其所在分组的全部测试点，保持原始顺序"""
+        selected = set(affected)
+        for test_ids in self.grader.config.groups.values():
+            members = {
+                str(test.path)
+                for test in test_cases
+                if any(matches_test_id(test, test_id) for test_id in test_ids)
+            }
+            if members & affected:
+                selected |= members
+        return [test for test in test_cases if str(test.path) in selected]
+
+    def _print_status(self, setup_ok: bool) -> None:
+        console = self.grader.console
+        if not setup_ok:
+            console.print("[red]Setup failed.[/red] Fix the error and save to retry.")
+        names = ", ".join(path.name for path in self.paths)
+        console.print(f"[dim]Watching {names} for changes (Ctrl-C to stop)...[/dim]")
+
+
+class SelfBenchmark:
+    """评分器自身的性能基准（--self-bench），结果以 JSON 输出
+
+    启动时间：分别冷启动解释器运行 grader.py -l 和 python -m grader -l（后者可以
+    使用 __pycache__ 中缓存的字节码），取中位数和 p95，并减去空解释器的启动时间得到
+    评分器自身的开销，与 [bench].startup_budget_ms 比较。同时用 -X importtime
+    检查 -l 路径是否导入了 rich 等第三方包。
+
+    评测流程：在临时目录中生成只使用 /bin/true 和 echo 的合成测试树，分阶段计时
+    测试发现、路径解析、子进程调度、结果检查、结果格式化和历史记录写入，
+    从而与学生工具本身的快慢无关地衡量 TestRunner、CompositeChecker 和
+    TableFormatter 等的开销。
+    """
+
+    FAST_PATH_FORBIDDEN = ("rich", "tomli", "tomllib", "asyncio")
+
+    def __init__(
+        self,
+        config: Config,
+        runs: Optional[int] = None,
+        cases: Optional[int] = None,
+        steps: Optional[int] = None,
+    ):
+        self.config = config
+        bench_config = config.bench_config
+        self.runs = max(1, runs or int(bench_config["runs"]))
+        self.cases = max(1, cases or int(bench_config["cases"]))
+        self.steps = max(1, steps or int(bench_config["steps"]))
+        self.dispatch_steps = max(1, int(bench_config["dispatch_steps"]))
+        self.script = Path(__file__).resolve()
+
+    def run(self) -> Dict[str, Any]:
+        return {"startup": self.measure_startup(), "harness": self.measure_harness()}
+
+    def measure_harness(self) -> Dict[str, Any]:
+        import contextlib
+        import tempfile
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix="grader-bench-") as root:
+            root_path = Path(root)
+            self._generate_tree(root_path)
+            os.chdir(root_path)
+            try:
+                phases: Dict[str, Any] = {}
+
+                # 测试发现：没有索引（首次运行）和索引命中两种情况
+                start = time.perf_counter()
+                grader = Grader(json_output=True)
+                test_cases = grader._load_test_cases()
+                grader.test_index.save()
+                phases["discovery_cold_ms"] = self._elapsed_ms(start)
+                start = time.perf_counter()
+                grader = Grader(json_output=True)
+                test_cases = grader._load_test_cases()
+                phases["discovery_warm_ms"] = self._elapsed_ms(start)
+
+                runner = grader.runner
+                steps = [
+                    (test, step, i)
+                    for test in test_cases
+                    for i, step in enumerate(test.run_steps, 1)
+                ]
+
+                # 路径解析
+                start = time.perf_counter()
+                resolved = []
+                for test, step, _ in steps:
+                    cmd = [runner._resolve_path(step["command"], test.path, test.path)]
+                    args = [
+                        runner._resolve_path(str(arg), test.path, test.path)
+                        for arg in step.get("args", [])
+                    ]
+                    resolved.append((cmd, args))
+                phases["path_resolution"] = self._per_step(start, len(steps))
+
+                # 子进程调度：两种执行引擎各运行一部分步骤
+                sample = list(zip(steps, resolved))[: self.dispatch_steps]
+                phases["dispatch"] = {}
+                for engine in ("subprocess", "asyncio"):
+                    runner.executor = (
+                        AsyncProcessExecutor(os.cpu_count() or 1)
+                        if engine == "asyncio"
+                        else None
+                    )
+                    start = time.perf_counter()
+                    for (test, step, i), (cmd, args) in sample:
+                        runner._run_step_process(test, step, i, cmd, args)
+                    phases["dispatch"][engine] = self._per_step(start, len(sample))
+                    if runner.executor is not None:
+                        runner.executor.close()
+                runner.executor = None
+
+                # 结果检查：使用合成的输出，不启动进程
+                start = time.perf_counter()
+                for (test, step, _), (cmd, args) in zip(steps, resolved):
+                    if "check" in step:
+                        output = " ".join(args) + "\n" if "echo" in cmd[0] else ""
+                        runner.checker.check(step, output, "", 0, test.path)
+                phases["checking"] = self._per_step(start, len(steps))
+
+                # 结果格式化和历史记录写入
+                results = [
+                    {
+                        "name": test.meta["name"],
+                        "success": i % 7 != 0,
+                        "status": "PASS" if i % 7 != 0 else "FAIL",
+                        "time": 0.01,
+                        "score": test.meta["score"] if i % 7 != 0 else 0,
+                        "max_score": test.meta["score"],
+                        "step_scores": None,
+                        "message": "All steps completed",
+                        "error_details": None,
+                    }
+                    for i, test in enumerate(test_cases)
+                ]
+                total_score = sum(result["score"] for result in results)
+                max_score = sum(result["max_score"] for result in results)
+                start = time.perf_counter()
+                TableFormatter(
+                    create_console(file=io.StringIO(), width=120)
+                ).format_results(test_cases, results, total_score, max_score)
+                phases["format_table_ms"] = self._elapsed_ms(start)
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    JsonFormatter().format_results(
+                        test_cases, results, total_score, max_score
+                    )
+                phases["format_json_ms"] = self._elapsed_ms(start)
+                samples = []
+                for _ in range(min(self.runs, 10)):
+                    start = time.perf_counter()
+                    grader._save_test_history(
+                        test_cases, results, total_score, max_score
+                    )
+                    samples.append(self._elapsed_ms(start))
+                phases["history_write_ms"] = round(percentile(samples, 50), 2)
+            finally:
+                os.chdir(cwd)
+
+        return {
+            "cases": self.cases,
+            "steps_per_case": self.steps,
+            "phases": phases,
+        }
+
+    def _generate_tree(self, root: Path) -> None:
+        """生成合成测试树：每个步骤轮流是带不同检查方式的 /bin/true 或 echo"""
+        true_cmd = shutil.which("true") or "/bin/true"
+        echo_cmd = shutil.which("echo") or "/bin/echo"
+        (root / "grader_config.toml").write_text(
+            '[paths]\ntests_dir = "tests"\ncases_dir = "tests/cases"\n'
+            'common_dir = "tests/common"\n'
+        )
+        (root / "tests" / "common").mkdir(parents=True)
+        kinds = [
+            f'command = "{true_cmd}"\n[run.check]\nreturn_code = 0\n',
+            f'command = "{echo_cmd}"\nargs = ["hello"]\n'
+            '[run.check]\nstdout = "ans.out"\n',
+            f'command = "{echo_cmd}"\nargs = ["hello", "${{build_dir}}/out.o"]\n'
+            '[run.check]\nstdout_pattern = "hello .*out"\n',
+            f'command = "{true_cmd}"\nargs = ["${{test_dir}}/in.c", "-o", '
+            '"${build_dir}/out.o"]\n',
+        ]
+        for case in range(1, self.cases + 1):
+            case_dir = root / "tests" / "cases" / f"{case}-bench"
+            case_dir.mkdir(parents=True)
+            (case_dir / "ans.out").write_text("hello\n")
+            lines = [f'[meta]\nname = "Bench {case}"\nscore = 10\n']
+            for step in range(self.steps):
+                lines.append(f'\n[[run]]\nname = "Step {step + 1}"\n')
+                lines.append(kinds[step % len(kinds)])
+            (case_dir / "config.toml").write_text("".join(lines))
+
+    def _per_step(self, start: float, count: int) -> Dict[str, Any]:
+        total = self._elapsed_ms(start)
+        return {
+            "steps": count,
+            "total_ms": total,
+            "per_step_us": round(total * 1000 / max(1, count), 2),
+        }
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    def passed(self, report: Dict[str, Any]) -> bool:
+        startup = report["startup"]
+        return startup["within_budget"] and not startup["fast_path_imports"]
+
+    def measure_startup(self) -> Dict[str, Any]:
+        python = sys.executable
+        floor = self._time_command([python, "-c", "pass"])
+        commands = {
+            "script": [python, str(self.script), "-l"],
+            "module": [python, "-m", self.script.stem, "-l"],
+        }
+        results = {}
+        for name, cmd in commands.items():
+            samples = self._time_command(cmd)
+            results[name] = {
+                "command": " ".join(cmd[1:]),
+                "median_ms": round(percentile(samples, 50), 2),
+                "p95_ms": round(percentile(samples, 95), 2),
+                "overhead_ms": round(
+                    percentile(samples, 50) - percentile(floor, 50), 2
+                ),
+            }
+        budget = float(self.config.bench_config["startup_budget_ms"])
+        return {
+            "runs": self.runs,
+            "interpreter_ms": round(percentile(floor, 50), 2),
+            "commands": results,
+            "budget_ms": budget,
+            "within_budget": results["script"]["overhead_ms"] <= budget,
+            "fast_path_imports": self._fast_path_imports(),
+        }
+
+    def _time_command(self, cmd: List[str]) -> List[float]:
+        env = os.environ.copy()
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        # 预热一次，确保字节码缓存已经生成
+        subprocess.run(
+            cmd,
+            cwd=self.config.project_root,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        samples = []
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            subprocess.run(
+                cmd,
+                cwd=self.config.project_root,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    def _fast_path_imports(self) -> List[str]:
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", str(self.script), "-l"],
+            cwd=self.config.project_root,
+            capture_output=True,
+            text=True,
+        )
+        imported = set()
+        for line in process.stderr.splitlines():
+            if line.startswith("import time:") and line.count("|") == 2:
+                module = line.rsplit("|", 1)[1].strip()
+                if module.split(".")[0] in self.FAST_PATH_FORBIDDEN:
+                    imported.add(module.split(".")[0])
+        return sorted(imported)
+
+
+class LinkerBenchmark:
+    """学生链接器的吞吐量基准（--bench-linker）
+
+    为每个规模生成一组 C 源文件：强符号全局变量、弱符号及其在下一个编译单元中的
+    强符号覆盖、静态变量、跨编译单元的函数调用（R_X86_64_PC32）和指向其他编译单元
+    全局变量的指针（R_X86_64_64）。源文件只用 ${root_dir}/cc 编译一次并缓存在
+    [cache].dir 下，之后多次计时 ${root_dir}/ld 链接全部目标文件和 ${root_dir}/nm
+    读取每个目标文件，报告吞吐量，并在双对数坐标下拟合 耗时 ∝ 符号数^k，
+    k 明显大于 1 说明符号解析或重定位修补的实现是超线性的。
+    """
+
+    # 生成器的格式变化时修改版本号，使缓存的目标文件失效
+    GENERATOR_VERSION = 1
+    # 每个 k 生成的符号数（全局变量、弱符号、静态变量、指针、函数，
+    # 以及半数的弱符号覆盖）
+    SYMBOLS_PER_ITEM = 5.5
+    MAX_UNITS = 64
+    CC_FLAGS = ["-Os", "-fno-PIE", "-fno-PIC"]
+
+    def __init__(
+        self,
+        config: Config,
+        sizes: Optional[List[int]] = None,
+        runs: Optional[int] = None,
+    ):
+        self.config = config
+        bench_config = config.bench_config
+        self.sizes = sorted(
+            {max(1, int(size)) for size in sizes or bench_config["linker_sizes"]}
+        )
+        self.runs = max(1, runs or int(bench_config["linker_runs"]))
+        self.work_dir = (
+            config.project_root / config.cache_config["dir"] / "bench-linker"
+        )
+        self.tools = {name: config.project_root / name for name in ("cc", "ld", "nm")}
+        self.minilibc = config.paths["common_dir"] / "minilibc.fle"
+
+    def run(self) -> Dict[str, Any]:
+        results = [self.measure_size(size) for size in self.sizes]
+        fit = {}
+        for tool in ("ld", "nm"):
+            measured = [result[tool] for result in results if tool in result]
+            # 失败的运行耗时没有意义（往往提前退出），只要有一个规模失败就不拟合
+            if any(not timing["success"] for timing in measured):
+                fit[tool] = None
+                continue
+            fit[tool] = self.fit_scaling(
+                [
+                    (result["symbols"], result[tool]["median_ms"])
+                    for result in results
+                    if tool in result
+                ]
+            )
+        return {"runs": self.runs, "sizes": results, "fit": fit}
+
+    def measure_size(self, size: int) -> Dict[str, Any]:
+        units = min(self.MAX_UNITS, max(1, size // 1000))
+        per_unit = max(1, round(size / (self.SYMBOLS_PER_ITEM * units)))
+        size_dir = self.work_dir / f"n{size}"
+        try:
+            objects = self._build_objects(size_dir, units, per_unit)
+        except RuntimeError as e:
+            return {"target_symbols": size, "units": units, "error": str(e)}
+
+        symbols = relocations = 0
+        for path in objects:
+            for name, section in self._load_fle(path).items():
+                if name == "shdrs" or not isinstance(section, list):
+                    continue
+                for line in section:
+                    if line.startswith(("🏷️", "📤", "📎")):
+                        symbols += 1
+                    elif line.startswith("❓"):
+                        relocations += 1
+
+        output = size_dir / "program"
+        ld_cmd = [str(self.tools["ld"])] + [str(path) for path in objects]
+        ld_cmd += [str(self.minilibc), "-o", str(output)]
+        nm_cmds = [[str(self.tools["nm"]), str(path)] for path in objects]
+        return {
+            "target_symbols": size,
+            "units": units,
+            "symbols": symbols,
+            "relocations": relocations,
+            "ld": self._time_tool([ld_cmd], symbols),
+            "nm": self._time_tool(nm_cmds, symbols),
+        }
+
+    def _time_tool(self, commands: List[List[str]], symbols: int) -> Dict[str, Any]:
+        samples = []
+        max_rss_kb = None
+        error = None
+        for _ in range(self.runs):
+            start = time.perf_counter()
+            for cmd in commands:
+                process = run_process(
+                    cmd,
+                    cwd=self.config.project_root,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+                if process.rusage and process.rusage["max_rss_kb"] is not None:
+                    max_rss_kb = max(max_rss_kb or 0, process.rusage["max_rss_kb"])
+                if process.returncode != 0 and error is None:
+                    error = (
+                        f"exit code {process.returncode}: "
+                        + process.stderr.strip()[-200:]
+                    )
+            samples.append((time.perf_counter() - start) * 1000)
+        median = percentile(samples, 50)
+        result = {
+            "median_ms": round(median, 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "symbols_per_s": round(symbols / (median / 1000)) if median else None,
+            # 不能使用启动器且低于评分器自身峰值内存时无法测量（见 RusagePopen）
+            "max_rss_mb": round(max_rss_kb / 1024, 1) if max_rss_kb else None,
+            "success": error is None,
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def _build_objects(self, size_dir: Path, units: int, per_unit: int) -> List[Path]:
+        """生成并编译源文件；生成参数和 cc 未变化时复用上次的目标文件"""
+        objects = [size_dir / f"unit{i}.fle" for i in range(units)]
+        stamp = size_dir / "stamp.json"
+        key = {
+            "version": self.GENERATOR_VERSION,
+            "units": units,
+            "per_unit": per_unit,
+            "flags": self.CC_FLAGS,
+            "cc": file_digest(self.tools["cc"].resolve()),
+        }
+        try:
+            if json.loads(stamp.read_text()) == key and all(
+                path.exists() for path in objects
+            ):
+                return objects
+        except (OSError, ValueError):
+            pass
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        shutil.rmtree(size_dir, ignore_errors=True)
+        size_dir.mkdir(parents=True)
+        sources = []
+        for i in range(units):
+            source = size_dir / f"unit{i}.c"
+            source.write_text(self._generate_unit(i, units, per_unit))
+            sources.append(source)
+
+        def compile_unit(source: Path) -> subprocess.CompletedProcess:
+            return subprocess.run(
+                [str(self.tools["cc"]), str(source), "-o"]
+                + [str(source.with_suffix(".o"))]
+                + [f"-I{self.config.paths['common_dir']}"]
+                + self.CC_FLAGS,
+                cwd=self.config.project_root,
+                capture_output=True,
+                text=True,
+            )
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            for source, process in zip(sources, pool.map(compile_unit, sources)):
+                if process.returncode != 0:
+                    raise RuntimeError(
+                        f"Failed to compile {source.name}: "
+                        + process.stderr.strip()[-200:]
+                    )
+        stamp.write_text(json.dumps(key))
+        return objects
+
+    @staticmethod
+    def _generate_unit(i: int, units: int, per_unit: int) -> str:
+        """第 i 个编译单元：函数调用链和指针都指向下一个编译单元的符号"""
+        j = (i + 1) % units
+        prev = (i - 1) % units
+        lines = ["/* Generated by grader.py --bench-linker */"]
+        for k in range(per_unit):
+            if j != i:
+                lines.append(f"extern int g{j}_{k};")
+                if k > 0:
+                    lines.append(f"int f{j}_{k - 1}(int x);")
+            # 弱符号；下一个编译单元为其中一半提供强符号覆盖
+            lines.append(f"__attribute__((weak)) int w{i}_{k} = 1;")
+            if units > 1 and k % 2 == 0:
+                lines.append(f"int w{prev}_{k} = 2;")
+            lines.append(f"int g{i}_{k} = {k};")
+            lines.append(f"static int s{i}_{k};")
+            # 指向其他编译单元全局变量的指针产生 R_X86_64_64 重定位
+            lines.append(f"int *p{i}_{k} = &g{j}_{k};")
+            call = f" + f{j}_{k - 1}(x - 1)" if k > 0 else ""
+            lines.append(
+                f"int f{i}_{k}(int x) {{ if (x <= 0) return 0; s{i}_{k} += x; "
+                f"return s{i}_{k} + g{j}_{k} + w{i}_{k} + *p{i}_{k}{call}; }}"
+            )
+        if i == 0:
+            lines.append(f"int main(void) {{ return f0_{per_unit - 1}(1) & 0; }}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _load_fle(path: Path) -> Dict[str, Any]:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        if text.startswith("#!"):
+            text = text.split("\n", 1)[1]
+        return json.loads(text)
+
+    @staticmethod
+    def fit_scaling(points: List[Tuple[int, float]]) -> Optional[Dict[str, Any]]:
+        """最小二乘拟合 log(耗时) = k·log(符号数) + b"""
+        points = [(n, t) for n, t in points if n > 0 and t > 0]
+        if len({n for n, _ in points}) < 2:
+            return None
+        xs = [math.log(n) for n, _ in points]
+        ys = [math.log(t) for _, t in points]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        exponent = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum(
+            (x - mean_x) ** 2 for x in xs
+        )
+        if exponent < 1.25:
+            complexity = "~O(n)"
+        elif exponent < 1.75:
+            complexity = "superlinear"
+        else:
+            complexity = "~O(n^2)"
+        return {
+            "exponent": round(exponent, 2),
+            "coefficient_ms": round(math.exp(mean_y - exponent * mean_x), 6),
+            "complexity": complexity,
+        }
+
+    @staticmethod
+    def print_report(console: "Console", report: Dict[str, Any]) -> None:
+        from rich.table import Table
+
+        table = Table(show_header=True, header_style="bold")
+        table.add_column("Symbols", justify="right", no_wrap=True)
+        table.add_column("Relocs", justify="right", no_wrap=True)
+        table.add_column("ld median", justify="right", no_wrap=True)
+        table.add_column("ld sym/s", justify="right", no_wrap=True)
+        table.add_column("ld Max RSS", justify="right", no_wrap=True)
+        table.add_column("nm median", justify="right", no_wrap=True)
+        table.add_column("Message")
+        for result in report["sizes"]:
+            if "error" in result:
+                table.add_row(
+                    str(result["target_symbols"]),
+                    "-",
+                    "-",
+                    "-",
+                    "-",
+                    "-",
+                    f"[red]{result['error']}[/red]",
+                )
+                continue
+            ld, nm = result["ld"], result["nm"]
+            table.add_row(
+                str(result["symbols"]),
+                str(result["relocations"]),
+                f"{ld['median_ms']:.1f}ms",
+                str(ld["symbols_per_s"] or "-"),
+                f"{ld['max_rss_mb']:.1f}MB" if ld["max_rss_mb"] is not None else "-",
+                f"{nm['median_ms']:.1f}ms",
+                ", ".join(
+                    f"[red]{tool} failed[/red]"
+                    for tool in ("ld", "nm")
+                    if not result[tool]["success"]
+                ),
+            )
+        console.print(table)
+        errors = {
+            result[tool]["error"]
+            for result in report["sizes"]
+            for tool in ("ld", "nm")
+            if tool in result and not result[tool]["success"]
+        }
+        for error in sorted(errors):
+            console.print(f"[red]Error:[/red] {error}")
+        for tool, fit in report["fit"].items():
+            if fit is not None:
+                console.print(
+                    f"{tool}: time ∝ n^{fit['exponent']} ({fit['complexity']})"
+                )
+
+
+class CaseGenerator:
+    """生成大规模的符号解析和重定位正确性测试点（grader.py generate）
+
+    每个测试点包含多个编译单元和一个 main.c：强符号全局变量、.bss 变量和数组、
+    在下一个编译单元中被强符号覆盖的弱变量和弱函数（参考 7-weak-override）、
+    各编译单元中同名的静态变量和静态函数（参考 9-local-symbol）、指向其他编译单元
+    全局变量的指针以及跨编译单元的函数调用链。所有外部声明放在 gen.h 中。
+
+    相同的种子和参数总是生成相同的源文件。ans.out 来自用系统 gcc 以与 cc 相同的
+    选项编译、静态链接 minilibc.c 后在本机运行的输出。
+    """
+
+    # 与 src/base/cc.cpp 中传给 gcc 的选项保持一致
+    NATIVE_FLAGS = [
+        "-static",
+        "-fno-common",
+        "-nostdlib",
+        "-ffreestanding",
+        "-fno-asynchronous-unwind-tables",
+    ]
+    CODE_MODELS = {
+        "default": [],
+        "no-pie": ["-fno-PIE", "-fno-PIC"],
+        "pie": ["-fPIE"],
+    }
+    # 每个编号 k 大约产生的符号数（强变量、.bss 变量、弱变量、指针、弱函数、函数，
+    # 以及下一个编译单元中的覆盖定义）
+    SYMBOLS_PER_ITEM = 7
+    MODULUS = 10007
+
+    def __init__(
+        self,
+        config: Config,
+        seed: int,
+        units: Optional[int] = None,
+        symbols: Optional[int] = None,
+        plan: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.config = config
+        generate_config = config.generate_config
+        self.seed = seed
+        self.units = max(1, units or int(generate_config["units"]))
+        symbols = symbols or int(generate_config["symbols"])
+        self.per_unit = max(1, symbols // self.SYMBOLS_PER_ITEM)
+        self.score = generate_config["score"]
+        import random
+
+        self.rng = random.Random(seed)
+        self.code_model = self.rng.choice(sorted(self.CODE_MODELS))
+        # 指定 plan 时（模糊测试缩减失败程序）直接使用，规模以它为准
+        if plan is not None:
+            self.units = len(plan)
+            self.per_unit = len(plan[0]["items"])
+        self.plan = plan if plan is not None else self._plan()
+
+    def generate(self, case_dir: Optional[Path] = None) -> Path:
+        """写出测试点目录并返回其路径
+
+        不指定目录时写到 cases_dir 下；同一种子的测试点已存在时原地重新生成。
+        """
+        if case_dir is None:
+            case_dir = self._case_dir()
+
+        sources = self._sources()
+        stdout, return_code = self._native_output(sources)
+        if return_code != 0:
+            raise RuntimeError(
+                f"Native program for seed {self.seed} exited with code {return_code}"
+            )
+
+        shutil.rmtree(case_dir, ignore_errors=True)
+        case_dir.mkdir(parents=True)
+        for name, text in sources.items():
+            (case_dir / name).write_text(text)
+        (case_dir / "ans.out").write_text(stdout)
+        (case_dir / "config.toml").write_text(self._config_toml(sources))
+        return case_dir
+
+    def _case_dir(self) -> Path:
+        cases_dir = self.config.paths["cases_dir"]
+        suffix = f"-gen-seed{self.seed}"
+        for path in cases_dir.iterdir():
+            if path.name.endswith(suffix):
+                return path
+        numbers = [
+            int(match.group(1))
+            for match in (re.match(r"(\d+)", path.name) for path in cases_dir.iterdir())
+            if match
+        ]
+        return cases_dir / f"{max(numbers, default=0) + 1}{suffix}"
+
+    def _plan(self) -> List[Dict[str, Any]]:
+        """为每个编译单元预先决定符号的初值，以及哪些弱符号在下一个编译单元中被覆盖"""
+        rng = self.rng
+
+        def override() -> Optional[int]:
+            # 只有一个编译单元时没有可以提供覆盖定义的单元
+            if self.units > 1 and rng.random() < 0.5:
+                return rng.randrange(1, 1000)
+            return None
+
+        plan = []
+        for i in range(self.units):
+            items = []
+            for k in range(self.per_unit):
+                items.append(
+                    {
+                        "g": rng.randrange(1, 1000),
+                        "w": rng.randrange(1, 1000),
+                        "wf": rng.randrange(1, 1000),
+                        "w_override": override(),
+                        "wf_override": override(),
+                        "target": (
+                            rng.randrange(self.units),
+                            rng.randrange(self.per_unit),
+                        ),
+                    }
+                )
+            plan.append(
+                {
+                    "local": rng.randrange(1, 1000),
+                    "array": rng.randrange(8, 64),
+                    "items": items,
+                }
+            )
+        return plan
+
+    def _sources(self) -> Dict[str, str]:
+        plan = self.plan
+        n, m = self.units, self.MODULUS
+        header = ["#pragma once", "/* Generated by grader.py generate */"]
+        for i, unit in enumerate(plan):
+            header.append(f"extern int u{i}_arr[{unit['array']}];")
+            header.append(f"int u{i}_run(void);")
+            for k in range(self.per_unit):
+                header.append(
+                    f"extern int u{i}_g{k}, u{i}_b{k}, u{i}_w{k}, *u{i}_p{k};"
+                )
+                header.append(f"int u{i}_wf{k}(int x);")
+                header.append(f"int u{i}_f{k}(int x);")
+
+        sources = {"gen.h": "\n".join(header) + "\n"}
+        for i, unit in enumerate(plan):
+            j = (i + 1) % n
+            prev = plan[(i - 1) % n]["items"]
+            lines = [
+                '#include "minilibc.h"',
+                '#include "gen.h"',
+                "",
+                "/* 每个编译单元都有同名的局部符号 */",
+                f"static int local_state = {unit['local']};",
+                "",
+                "static int local_step(int x)",
+                "{",
+                f"    local_state = (local_state * 3 + x) % {m};",
+                "    return local_state;",
+                "}",
+                "",
+                f"int u{i}_arr[{unit['array']}];",
+            ]
+            for k, item in enumerate(unit["items"]):
+                ti, tk = item["target"]
+                lines += [
+                    f"int u{i}_g{k} = {item['g']};",
+                    f"int u{i}_b{k};",
+                    f"__attribute__((weak)) int u{i}_w{k} = {item['w']};",
+                    f"int *u{i}_p{k} = &u{ti}_g{tk};",
+                    f"__attribute__((weak)) int u{i}_wf{k}(int x) "
+                    f"{{ return (x + {item['wf']}) % {m}; }}",
+                ]
+                # 覆盖上一个编译单元的弱符号
+                if n > 1 and prev[k]["w_override"] is not None:
+                    lines.append(f"int u{(i - 1) % n}_w{k} = {prev[k]['w_override']};")
+                if n > 1 and prev[k]["wf_override"] is not None:
+                    lines.append(
+                        f"int u{(i - 1) % n}_wf{k}(int x) "
+                        f"{{ return (x * 2 + {prev[k]['wf_override']}) % {m}; }}"
+                    )
+                call = f" + u{j}_f{k - 1}(x)" if k > 0 else ""
+                lines.append(
+                    f"int u{i}_f{k}(int x) {{ return (u{i}_g{k} + *u{i}_p{k} + "
+                    f"u{j}_wf{k}(x){call}) % {m}; }}"
+                )
+            lines += [
+                "",
+                f"int u{i}_run(void)",
+                "{",
+                "    int sum = 0;",
+                "    int zero = 0;",
+                f"    for (int k = 0; k < {unit['array']}; k++)",
+                f"        zero += u{i}_arr[k];",
+                f"    for (int k = 0; k < {unit['array']}; k++)",
+                f"        u{i}_arr[k] = local_step(k);",
+            ]
+            for k in range(self.per_unit):
+                lines += [
+                    f"    u{i}_b{k} = local_step({k});",
+                    f"    sum = (sum + u{i}_f{k}({k}) + u{i}_b{k} + u{i}_w{k}) % {m};",
+                ]
+            lines += [
+                f'    printf("u{i}: sum=%d zero=%d local=%d\\n", sum, zero, local_state);',
+                "    return sum;",
+                "}",
+            ]
+            sources[f"unit{i}.c"] = "\n".join(lines) + "\n"
+
+        main = [
+            '#include "minilibc.h"',
+            '#include "gen.h"',
+            "",
+            "int main()",
+            "{",
+            "    int total = 0;",
+        ]
+        for i, unit in enumerate(plan):
+            main.append(
+                f"    total = (total + u{i}_run() + u{i}_arr[{unit['array'] - 1}]) % {m};"
+            )
+        main += ['    printf("total=%d\\n", total);', "    return 0;", "}"]
+        sources["main.c"] = "\n".join(main) + "\n"
+        return sources
+
+    def _native_output(self, sources: Dict[str, str]) -> Tuple[str, int]:
+        import tempfile
+
+        common_dir = self.config.paths["common_dir"]
+        with tempfile.TemporaryDirectory(prefix="grader-gen-") as tmp:
+            tmp_path = Path(tmp)
+            for name, text in sources.items():
+                (tmp_path / name).write_text(text)
+            program = tmp_path / "program"
+            subprocess.run(
+                ["gcc"]
+                + self.NATIVE_FLAGS
+                + self.CODE_MODELS[self.code_model]
+                + ["-Os", f"-I{common_dir}", f"-I{tmp_path}", "-o", str(program)]
+                + [str(tmp_path / name) for name in sources if name.endswith(".c")]
+                + [str(common_dir / "minilibc.c")],
+                check=True,
+                capture_output=True,
+            )
+            process = subprocess.run(
+                [str(program)], capture_output=True, text=True, timeout=10
+            )
+            return process.stdout, process.returncode
+
+    def _config_toml(self, sources: Dict[str, str]) -> str:
+        objects = [name[:-2] for name in sources if name.endswith(".c")]
+        flags = [f'    "{flag}",' for flag in self.CODE_MODELS[self.code_model]]
+        lines = [
+            "[meta]",
+            f'name = "Generated Linker Stress Test (seed {self.seed})"',
+            f'description = "Generated by grader.py generate --seed {self.seed}: '
+            f"{self.units} translation units, {self.code_model} code model, "
+            'weak/strong/local symbol mix with cross-file calls"',
+            f"score = {self.score}",
+        ]
+        for name in objects:
+            lines += [
+                "",
+                "[[run]]",
+                f'name = "Compile {name}.c"',
+                'command = "${root_dir}/cc"',
+                "args = [",
+                f'    "${{test_dir}}/{name}.c",',
+                '    "-o",',
+                f'    "${{build_dir}}/{name}.o",',
+                '    "-I${common_dir}",',
+                '    "-I${test_dir}",',
+                '    "-Os",',
+                *flags,
+                "]",
+                "",
+                "[run.check]",
+                f'files = ["${{build_dir}}/{name}.fle"]',
+            ]
+        lines += [
+            "",
+            "[[run]]",
+            'name = "Link program"',
+            'command = "${root_dir}/ld"',
+            "args = [",
+        ]
+        lines += [f'    "${{build_dir}}/{name}.fle",' for name in objects]
+        lines += [
+            '    "${common_dir}/minilibc.fle",',
+            '    "-o",',
+            '    "${build_dir}/program",',
+            "]",
+            "",
+            "[run.check]",
+            'files = ["${build_dir}/program"]',
+            "",
+            "[[run]]",
+            'name = "Run program"',
+            'command = "${root_dir}/exec"',
+            'args = ["${build_dir}/program"]',
+            "",
+            "[run.check]",
+            'stdout = "ans.out"',
+            "return_code = 0",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+# 模糊测试工作进程中复用的 TestRunner（每个进程一个）
+_fuzz_runner: Optional[TestRunner] = None
+
+
+def fuzz_program(
+    project_root: str,
+    work_dir: str,
+    seed: int,
+    units: Optional[int] = None,
+    symbols: Optional[int] = None,
+    plan: Optional[List[Dict[str, Any]]] = None,
+    name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """在工作进程中生成一个程序并经过 cc → ld → exec 运行，与本机 gcc 的输出比较
+
+    指定 plan 时按它生成程序（缩减失败程序时使用），否则按种子和规模生成。
+    程序通过时删除其目录；失败时保留，并在结果中返回 plan，供缩减和复现使用。
+    """
+    global _fuzz_runner
+    config = Config(Path(project_root))
+    if _fuzz_runner is None:
+        _fuzz_runner = TestRunner(config, show_progress=False)
+    generator = CaseGenerator(config, seed, units, symbols, plan=plan)
+    units = generator.units
+    symbols = generator.per_unit * CaseGenerator.SYMBOLS_PER_ITEM
+    case_dir = Path(work_dir) / (name or f"seed{seed}-u{units}-s{symbols}")
+    outcome = {"seed": seed, "units": units, "symbols": symbols}
+    try:
+        generator.generate(case_dir)
+    except (RuntimeError, subprocess.SubprocessError) as e:
+        # 本机编译或运行失败说明生成器有问题，不算作 FLE 工具的错误
+        shutil.rmtree(case_dir, ignore_errors=True)
+        return {**outcome, "status": "invalid", "message": str(e)}
+
+    with open(case_dir / "config.toml", "rb") as f:
+        case_config = load_toml(f)
+    test = TestCase(
+        path=case_dir, meta=case_config["meta"], run_steps=case_config["run"]
+    )
+    result = _fuzz_runner.run_test(test)
+    if result.success:
+        shutil.rmtree(case_dir, ignore_errors=True)
+        return {**outcome, "status": "pass"}
+    return {
+        **outcome,
+        "status": "fail",
+        "message": result.message,
+        "case_dir": str(case_dir),
+        "plan": generator.plan,
+    }
+
+
+class Fuzzer:
+    """FLE 工具链与本机 gcc 的差分模糊测试（grader.py fuzz）
+
+    每个种子用 CaseGenerator 生成一个随机但行为确定的程序（规模也由种子决定），
+    在进程池中分别用本机 gcc 和 cc → ld → exec 步骤流水线运行并比较输出。
+    发现不一致时，在保持失败的前提下逐步删减失败程序的编译单元、符号、弱符号
+    覆盖和跨编译单元的重定位（见 _minimize），把缩减后的程序作为完整的测试点
+    目录保存到 [fuzz].dir。
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        seed: int,
+        workers: Optional[int] = None,
+        max_failures: Optional[int] = None,
+    ):
+        self.config = config
+        fuzz_config = config.fuzz_config
+        self.seed = seed
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_failures = max(1, max_failures or int(fuzz_config["max_failures"]))
+        self.max_units = max(1, int(fuzz_config["max_units"]))
+        self.max_symbols = max(
+            CaseGenerator.SYMBOLS_PER_ITEM, int(fuzz_config["max_symbols"])
+        )
+        self.output_dir = config.project_root / fuzz_config["dir"]
+        self.work_dir = config.project_root / config.cache_config["dir"] / "fuzz"
+
+    def program_size(self, seed: int) -> Tuple[int, int]:
+        """种子对应的程序规模（编译单元数，每个编译单元的符号数）"""
+        import random
+
+        rng = random.Random(f"size-{seed}")
+        return (
+            rng.randint(1, self.max_units),
+            rng.randint(CaseGenerator.SYMBOLS_PER_ITEM, self.max_symbols),
+        )
+
+    def run(
+        self,
+        iterations: Optional[int] = None,
+        duration: Optional[float] = None,
+        on_progress=None,
+    ) -> Dict[str, Any]:
+        """运行到达到程序数、时长或失败数上限为止
+
+        on_progress(stats) 大约每秒调用一次，stats 中包含目前的吞吐量。
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.work_dir.mkdir(parents=True)
+        stats = {"programs": 0, "passed": 0, "invalid": 0, "failed": 0}
+        failures = []
+        start = time.perf_counter()
+        last_progress = start
+        next_seed = self.seed
+
+        def should_submit() -> bool:
+            if len(failures) >= self.max_failures:
+                return False
+            if iterations is not None and next_seed - self.seed >= iterations:
+                return False
+            if duration is not None and time.perf_counter() - start >= duration:
+                return False
+            return True
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            try:
+                while True:
+                    while len(pending) < self.workers * 2 and should_submit():
+                        pending.add(
+                            pool.submit(
+                                fuzz_program,
+                                str(self.config.project_root),
+                                str(self.work_dir),
+                                next_seed,
+                                *self.program_size(next_seed),
+                            )
+                        )
+                        next_seed += 1
+                    if not pending:
+                        break
+                    done, pending = wait(
+                        pending, timeout=1, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        outcome = future.result()
+                        stats["programs"] += 1
+                        if outcome["status"] == "pass":
+                            stats["passed"] += 1
+                        elif outcome["status"] == "invalid":
+                            stats["invalid"] += 1
+                        else:
+                            stats["failed"] += 1
+                            if len(failures) < self.max_failures:
+                                failures.append(outcome)
+                    now = time.perf_counter()
+                    if (
+                        on_progress is not None
+                        and stats["programs"]
+                        and now - last_progress >= 1
+                    ):
+                        on_progress(self._summary(stats, now - start))
+                        last_progress = now
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+
+            report = self._summary(stats, time.perf_counter() - start)
+            report["failures"] = [self._minimize(pool, failure) for failure in failures]
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return report
+
+    @staticmethod
+    def _summary(stats: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+        return {
+            **stats,
+            "elapsed_s": round(elapsed, 2),
+            "programs_per_s": round(stats["programs"] / elapsed, 2) if elapsed else 0,
+        }
+
+    def _minimize(
+        self, pool: "ProcessPoolExecutor", failure: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """在保持失败的前提下缩减失败程序本身（CaseGenerator 的 plan）
+
+        每一步尝试一个更小的变体：删除一个编译单元、删除每个编译单元中同一编号的
+        一组符号、去掉一个弱符号覆盖定义、把一个跨编译单元的指针（一条重定位）
+        改为指向本单元的变量。候选按这个顺序以进程池大小为一批并行运行，接受第一个
+        仍然失败的候选后从头重新生成候选，直到没有候选仍然失败为止。每个候选的
+        ans.out 都重新由本机 gcc 得出。
+        """
+        import itertools
+
+        seed = failure["seed"]
+        best = failure
+        attempts = 0
+        improved = True
+        while improved:
+            improved = False
+            candidates = self._reductions(best["plan"])
+            while not improved:
+                batch = list(itertools.islice(candidates, self.workers))
+                if not batch:
+                    break
+                futures = [
+                    pool.submit(
+                        fuzz_program,
+                        str(self.config.project_root),
+                        str(self.work_dir),
+                        seed,
+                        plan=plan,
+                        name=f"seed{seed}-r{attempts + n}",
+                    )
+                    for n, plan in enumerate(batch)
+                ]
+                attempts += len(batch)
+                for outcome in (future.result() for future in futures):
+                    if outcome["status"] == "fail" and not improved:
+                        best, improved = outcome, True
+
+        # 把缩减后的失败程序保存为完整的测试点目录
+        target = self.output_dir / f"seed{seed}-u{best['units']}-s{best['symbols']}"
+        shutil.rmtree(target, ignore_errors=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copytree(best["case_dir"], target)
+        return {
+            "seed": seed,
+            "original": {"units": failure["units"], "symbols": failure["symbols"]},
+            "minimized": {"units": best["units"], "symbols": best["symbols"]},
+            "attempts": attempts,
+            "message": best["message"],
+            "case_dir": os.path.relpath(target, self.config.project_root),
+        }
+
+    @staticmethod
+    def _reductions(plan: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """依次产出 plan 的每个缩小一步的变体，粗粒度的缩减在前"""
+        units, per_unit = len(plan), len(plan[0]["items"])
+        if units > 1:
+            for i in range(units):
+                yield Fuzzer._drop_unit(plan, i)
+        if per_unit > 1:
+            for k in range(per_unit):
+                yield Fuzzer._drop_item(plan, k)
+        for i, unit in enumerate(plan):
+            for k, item in enumerate(unit["items"]):
+                for key in ("w_override", "wf_override"):
+                    if item[key] is not None:
+                        reduced = copy.deepcopy(plan)
+                        reduced[i]["items"][k][key] = None
+                        yield reduced
+                if tuple(item["target"]) != (i, k):
+                    reduced = copy.deepcopy(plan)
+                    reduced[i]["items"][k]["target"] = (i, k)
+                    yield reduced
+
+    @staticmethod
+    def _drop_unit(plan: List[Dict[str, Any]], index: int) -> List[Dict[str, Any]]:
+        """删除一个编译单元，指向它的指针改为指向本单元的同编号变量"""
+        reduced = copy.deepcopy(plan[:index] + plan[index + 1 :])
+        for i, unit in enumerate(reduced):
+            for k, item in enumerate(unit["items"]):
+                ti, tk = item["target"]
+                if ti == index:
+                    item["target"] = (i, k)
+                else:
+                    item["target"] = (ti - 1 if ti > index else ti, tk)
+        return reduced
+
+    @staticmethod
+    def _drop_item(plan: List[Dict[str, Any]], index: int) -> List[Dict[str, Any]]:
+        """删除每个编译单元中编号为 index 的一组符号，指向它们的指针改为指向本单元"""
+        reduced = copy.deepcopy(plan)
+        for i, unit in enumerate(reduced):
+            del unit["items"][index]
+            for k, item in enumerate(unit["items"]):
+                ti, tk = item["target"]
+                if tk == index:
+                    item["target"] = (i, k)
+                else:
+                    item["target"] = (ti, tk - 1 if tk > index else tk)
+        return reduced
+
+
+class PerformanceTrends:
+    """测试点和步骤耗时的历史趋势（grader.py stats）
+
+    对每个测试点以及其中的每个步骤，统计测试历史记录中全部样本的中位数和 p95，
+    并把最近一次的耗时与之前 window 次的中位数比较：比值不小于 threshold 且
+    增量超过 min_delta_ms 时标记为回归。增量下限用于忽略只需几毫秒的步骤上的
+    调度抖动。测试点耗时和步骤耗时都是墙钟时间；通过 --changed 缓存通过的结果
+    没有实际运行，不计入样本。
+    """
+
+    def __init__(
+        self,
+        window: int = 5,
+        threshold: float = 1.5,
+        min_delta_ms: float = 50.0,
+    ):
+        self.window = max(1, window)
+        self.threshold = threshold
+        self.min_delta_ms = min_delta_ms
+
+    def analyze(self, runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """runs 为 ResultStore.runs() 的结果（从旧到新）
+
+        按测试目录名而不是绝对路径归并样本，项目目录移动或在其他位置检出后
+        历史记录仍然连续。
+        """
+        tests: Dict[str, Dict[str, Any]] = {}
+        for run in runs:
+            for test in run["tests"]:
+                if not test["time"]:
+                    continue
+                entry = tests.setdefault(
+                    Path(test["path"]).name,
+                    {"name": test["name"], "samples": [], "steps": {}},
+                )
+                entry["name"] = test["name"]
+                entry["samples"].append(test["time"] * 1000)
+                for usage in test.get("step_usage") or []:
+                    if "wall_time" not in usage:
+                        continue
+                    step = entry["steps"].setdefault(
+                        usage["step"], {"name": usage["name"], "samples": []}
+                    )
+                    step["name"] = usage["name"]
+                    step["samples"].append(usage["wall_time"] * 1000)
+
+        report_tests = []
+        for test_name in sorted(
+            tests, key=lambda name: TestCaseIndex.sort_key(Path(name))
+        ):
+            entry = tests[test_name]
+            trend = {
+                "test": test_name,
+                "name": entry["name"],
+                **self._trend(entry["samples"]),
+            }
+            trend["steps"] = [
+                {"step": index, "name": step["name"], **self._trend(step["samples"])}
+                for index, step in sorted(entry["steps"].items())
+            ]
+            report_tests.append(trend)
+
+        regressions = []
+        for test in report_tests:
+            if test["regressed"]:
+                regressions.append(test["test"])
+            regressions.extend(
+                f"{test['test']}: step {step['step']} '{step['name']}'"
+                for step in test["steps"]
+                if step["regressed"]
+            )
+        return {
+            "runs": len(runs),
+            "window": self.window,
+            "threshold": self.threshold,
+            "min_delta_ms": self.min_delta_ms,
+            "tests": report_tests,
+            "regressions": regressions,
+        }
+
+    def _trend(self, samples: List[float]) -> Dict[str, Any]:
+        latest = samples[-1]
+        previous = samples[-self.window - 1 : -1]
+        baseline = percentile(previous, 50) if previous else None
+        change = latest / baseline if baseline else None
+        return {
+            "samples": len(samples),
+            "latest_ms": round(latest, 1),
+            "median_ms": round(percentile(samples, 50), 1),
+            "p95_ms": round(percentile(samples, 95), 1),
+            "baseline_ms": round(baseline, 1) if baseline is not None else None,
+            "change": round(change, 2) if change is not None else None,
+            "regressed": change is not None
+            and change >= self.threshold
+            and latest - baseline >= self.min_delta_ms,
+        }
 
-        if not self.config.paths["cases_dir"].exists():
-            if not self.json_output:
-                self.console.print("[red]Error:[/red] tests/cases directory not found")
-            else:
-                print("Error: tests/cases directory not found", file=sys.stderr)
-            sys.exit(1)
+    @staticmethod
+    def print_report(
+        console: "Console", report: Dict[str, Any], show_steps: bool = False
+    ) -> None:
+        from rich.table import Table
 
-        def get_sort_key(path: Path) -> tuple:
-            # 尝试从文件夹名称中提取数字前缀
-            match = re.match(r"(\d+)", path.name)
-            if match:
-                # 如果有数字前缀，返回 (0, 数字值, 文件夹名) 元组
-                # 0 表示优先级最高
-                return (0, int(match.group(1)), path.name)
-            else:
-                # 如果没有数字前缀，返回 (1, 0, 文件夹名) 元组
-                # 1 表示优先级较低，这些文件夹会按字母顺序排在有数字前缀的文件夹后面
-                return (1, 0, path.name)
-
-        test_cases = []
-        # 使用自定义排序函数
-        for test_dir in sorted(
-            self.config.paths["cases_dir"].iterdir(), key=get_sort_key
-        ):
-            if test_dir.is_dir() and (test_dir / "config.toml").exists():
-                test_cases.append(self._load_single_test(test_dir))
+        table = Table(show_header=True, header_style="bold")
+        table.add_column("Test")
+        table.add_column("Runs", justify="right", no_wrap=True)
+        table.add_column("Latest", justify="right", no_wrap=True)
+        table.add_column("Median", justify="right", no_wrap=True)
+        table.add_column("p95", justify="right", no_wrap=True)
+        table.add_column(f"vs prev {report['window']}", justify="right", no_wrap=True)
+
+        def add_row(label: str, trend: Dict[str, Any]) -> None:
+            change = "-" if trend["change"] is None else f"{trend['change']:.2f}x"
+            if trend["regressed"]:
+                change = f"[red]{change}[/red]"
+            table.add_row(
+                label,
+                str(trend["samples"]),
+                f"{trend['latest_ms']:.1f}ms",
+                f"{trend['median_ms']:.1f}ms",
+                f"{trend['p95_ms']:.1f}ms",
+                change,
+            )
 
-        if not test_cases:
-            if not self.json_output:
-                self.console.print(
-                    "[red]Error:[/red] No test cases found in tests/cases/"
-                )
-            else:
-                print("Error: No test cases found in tests/cases/", file=sys.stderr)
-            sys.exit(1)
+        for test in report["tests"]:
+            add_row(test["test"], test)
+            for step in test["steps"]:
+                # 默认只列出回归的步骤
+                if show_steps or step["regressed"]:
+                    add_row(f"  {step['step']}. {step['name']}", step)
+        console.print(table)
+        if report["regressions"]:
+            console.print(
+                f"[red]Regressed[/red] (≥ {report['threshold']}x the median of "
+                f"the previous {report['window']} runs):"
+            )
+            for regression in report["regressions"]:
+                console.print(f"  {regression}")
+        else:
+            console.print("[green]No runtime regressions[/green]")
 
-        return test_cases
 
-    def _load_single_test(self, test_path: Path) -> TestCase:
-        try:
-            with open(test_path / "config.toml", "rb") as f:
-                config = tomli.load(f)
+def mann_whitney_p(baseline: List[float], current: List[float]) -> float:
+    """Mann-Whitney U 检验的单侧 p 值，备择假设为 current 整体大于 baseline
+
+    使用带平局校正和连续性校正的正态近似，每组有 8 个以上样本时足够准确。
+    """
+    n1, n2 = len(baseline), len(current)
+    values = sorted(
+        [(value, 0) for value in baseline] + [(value, 1) for value in current]
+    )
+    n = n1 + n2
+    rank_sum = 0.0
+    ties = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        # 相同的值取平均秩
+        rank = (i + j) / 2 + 1
+        rank_sum += rank * sum(group for _, group in values[i : j + 1])
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = rank_sum - n2 * (n2 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class ToolBaseline:
+    """学生工具耗时的基线记录与回归检验（grader.py baseline）
+
+    在测试点中找到命令为所选工具（默认 ld、nm、exec）的步骤，通过
+    TestRunner._execute_single_step 把每个这样的步骤重复运行 repeat 次并记录耗时，
+    保存为 [baseline].dir 下以名称（默认为当前 git 提交）命名的 JSON 文件。
+    比较时重新测量，对每个步骤用 Mann-Whitney U 检验判断耗时是否整体变长：
+    p 值小于 alpha、中位数之比不小于 min_ratio 且中位数增加超过 min_delta_ms 时
+    判为回归。
+
+    比较的是子进程的 CPU 时间（user + sys），没有 CPU 时间时才使用墙钟时间：
+    基线和本次测量在不同的时间进行，只需几毫秒的步骤的墙钟时间主要受机器负载和
+    进程启动影响，在相同的代码上也会出现显著的差异。
+    """
 
-            if "meta" not in config:
-                raise ValueError("Missing 'meta' section in config")
-            if "name" not in config["meta"]:
-                raise ValueError("Missing 'name' in meta section")
-            if "score" not in config["meta"]:
-                raise ValueError("Missing 'score' in meta section")
-            if "run" not in config:
-                raise ValueError("Missing 'run' section in config")
+    def __init__(
+        self,
+        config: Config,
+        tools: Optional[List[str]] = None,
+        repeat: Optional[int] = None,
+    ):
+        self.config = config
+        baseline_config = config.baseline_config
+        self.tools = set(tools or baseline_config["tools"])
+        self.repeat = max(2, repeat or int(baseline_config["repeat"]))
+        self.alpha = float(baseline_config["alpha"])
+        self.min_ratio = float(baseline_config["min_ratio"])
+        self.min_delta_ms = float(baseline_config["min_delta_ms"])
+        self.baseline_dir = config.project_root / baseline_config["dir"]
+
+    def measure(
+        self, test_cases: List[TestCase], console: Optional["Console"] = None
+    ) -> List[Dict[str, Any]]:
+        """依次运行测试点，返回所选工具每个步骤的耗时样本
 
-            return TestCase(
-                path=test_path, meta=config["meta"], run_steps=config["run"]
+        只关心计时，不输出测试点的进度和失败详情；console 只用于显示正在测量的测试点。
+        """
+        runner = TestRunner(
+            self.config, sample_tools=self.tools, sample_repeat=self.repeat
+        )
+        for test in test_cases:
+            if console is not None:
+                console.print(f"[dim]Measuring {test.path.name}...[/dim]")
+            runner.run_test(test)
+        return [
+            {"test": test, "step": step, **sample}
+            for (test, step), sample in sorted(
+                runner.samples.items(),
+                key=lambda item: (TestCaseIndex.sort_key(Path(item[0][0])), item[0][1]),
             )
-        except Exception as e:
-            if not self.json_output:
-                self.console.print(
-                    f"[red]Error:[/red] Failed to load test '{test_path.name}': {str(e)}"
-                )
+        ]
+
+    @staticmethod
+    def valid_name(name: str) -> bool:
+        """基线名称直接用作文件名，不能包含路径分隔符"""
+        return re.fullmatch(r"[\w.-]+", name) is not None and name not in (".", "..")
+
+    def path(self, name: str) -> Path:
+        return self.baseline_dir / f"{name}.json"
+
+    def save(self, name: str, steps: List[Dict[str, Any]]) -> Path:
+        path = self.path(name)
+        self.baseline_dir.mkdir(parents=True, exist_ok=True)
+        baseline = {
+            "name": name,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "repeat": self.repeat,
+            "tools": sorted(self.tools),
+            "steps": steps,
+        }
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+    def load(self, name: str) -> Dict[str, Any]:
+        with open(self.path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def names(self) -> List[str]:
+        """已保存的基线名称，最近保存的在最后"""
+        paths = sorted(
+            self.baseline_dir.glob("*.json"), key=lambda path: path.stat().st_mtime
+        )
+        return [path.stem for path in paths]
+
+    def compare(
+        self,
+        baseline: Dict[str, Any],
+        steps: List[Dict[str, Any]],
+        tests: Optional[Set[str]] = None,
+    ) -> Dict[str, Any]:
+        """tests 为本次测量的测试目录名，基线中其他测试点的步骤不计为缺失"""
+        previous = {
+            (step["test"], step["step"]): step
+            for step in baseline["steps"]
+            if tests is None or step["test"] in tests
+        }
+        results = []
+        for step in steps:
+            old = previous.pop((step["test"], step["step"]), None)
+            if old is None:
+                continue
+            metric = "cpu_ms" if "cpu_ms" in old and "cpu_ms" in step else "wall_ms"
+            before, after = old[metric], step[metric]
+            median_before, median_after = percentile(before, 50), percentile(after, 50)
+            ratio = median_after / median_before
+            significant = abs(median_after - median_before) >= self.min_delta_ms
+            slower = mann_whitney_p(before, after)
+            faster = mann_whitney_p(after, before)
+            if significant and slower < self.alpha and ratio >= self.min_ratio:
+                verdict = "slower"
+            elif significant and faster < self.alpha and ratio <= 1 / self.min_ratio:
+                verdict = "faster"
             else:
-                print(
-                    f"Error: Failed to load test '{test_path.name}': {str(e)}",
-                    file=sys.stderr,
-                )
-            sys.exit(1)
+                verdict = "unchanged"
+            results.append(
+                {
+                    "test": step["test"],
+                    "step": step["step"],
+                    "name": step["name"],
+                    "tool": step["tool"],
+                    "metric": metric,
+                    "baseline_median_ms": round(median_before, 3),
+                    "median_ms": round(median_after, 3),
+                    "ratio": round(ratio, 3),
+                    "p_value": round(min(slower, faster), 5),
+                    "verdict": verdict,
+                }
+            )
+        return {
+            "baseline": baseline["name"],
+            "alpha": self.alpha,
+            "min_ratio": self.min_ratio,
+            "min_delta_ms": self.min_delta_ms,
+            "steps": results,
+            # 基线中有、本次没有运行到的步骤（例如前面的步骤失败了）
+            "missing": [
+                f"{test}: step {index} '{step['name']}'"
+                for (test, index), step in previous.items()
+            ],
+            "regressions": sum(result["verdict"] == "slower" for result in results),
+        }
+
+    @staticmethod
+    def print_report(console: "Console", report: Dict[str, Any]) -> None:
+        from rich.table import Table
+
+        table = Table(show_header=True, header_style="bold")
+        table.add_column("Step")
+        table.add_column("Baseline", justify="right", no_wrap=True)
+        table.add_column("Current", justify="right", no_wrap=True)
+        table.add_column("Ratio", justify="right", no_wrap=True)
+        table.add_column("p", justify="right", no_wrap=True)
+        table.add_column("Verdict", no_wrap=True)
+        verdict_style = {
+            "slower": "[red]slower[/red]",
+            "faster": "[green]faster[/green]",
+            "unchanged": "unchanged",
+        }
+        for result in report["steps"]:
+            table.add_row(
+                f"{result['test']}: {result['step']}. {result['name']}",
+                f"{result['baseline_median_ms']:.2f}ms",
+                f"{result['median_ms']:.2f}ms",
+                f"{result['ratio']:.2f}x",
+                f"{result['p_value']:.3g}",
+                verdict_style[result["verdict"]],
+            )
+        console.print(table)
+        if any(result["metric"] == "wall_ms" for result in report["steps"]):
+            console.print("[dim]Medians of CPU time (user + sys), or wall time[/dim]")
+        else:
+            console.print("[dim]Medians of CPU time (user + sys)[/dim]")
+        for missing in report["missing"]:
+            console.print(f"[yellow]Not measured:[/yellow] {missing}")
+        if report["regressions"]:
+            console.print(
+                f"[red]{report['regressions']} step(s) slower than baseline "
+                f"'{report['baseline']}'[/red] (p < {report['alpha']}, median "
+                f"≥ {report['min_ratio']}x and +{report['min_delta_ms']}ms)"
+            )
+        else:
+            console.print(
+                f"[green]No regressions against baseline '{report['baseline']}'[/green]"
+            )
+
+
+def last_failed_tests() -> List[Dict[str, Any]]:
+    """最近一次运行中未通过的测试点（-l 和 -f 使用）；没有历史记录时报错退出"""
+    legacy_file = Path(".test_history")
+    if not Path(ResultStore.FILE).exists() and not legacy_file.exists():
+        print("No test history found", file=sys.stderr)
+        sys.exit(1)
+    store = ResultStore(Path(ResultStore.FILE), legacy_file=legacy_file)
+    try:
+        failed = store.last_failed()
+    finally:
+        store.close()
+    if failed is None:
+        print("Test history is empty", file=sys.stderr)
+        sys.exit(1)
+    return failed
 
 
 def get_current_shell() -> str:
@@ -1781,7 +6335,390 @@ def get_current_shell() -> str:
     return "bash"
 
 
+def generate_command(argv: List[str]) -> int:
+    """grader.py generate：按种子生成大规模链接器测试点"""
+    parser = argparse.ArgumentParser(
+        prog="grader.py generate",
+        description="Generate linker stress test cases under tests/cases",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1, help="Seed of the first case (default: 1)"
+    )
+    parser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=1,
+        help="Number of cases to generate, using consecutive seeds (default: 1)",
+    )
+    parser.add_argument(
+        "--units",
+        type=int,
+        metavar="N",
+        help="Translation units per case (default: [generate].units)",
+    )
+    parser.add_argument(
+        "--symbols",
+        type=int,
+        metavar="N",
+        help="Approximate symbols per translation unit (default: [generate].symbols)",
+    )
+    args = parser.parse_args(argv)
+
+    config = Config(Path.cwd())
+    console = create_console()
+    for seed in range(args.seed, args.seed + max(1, args.count)):
+        generator = CaseGenerator(config, seed, args.units, args.symbols)
+        try:
+            case_dir = generator.generate()
+        except (RuntimeError, subprocess.SubprocessError) as e:
+            stderr = getattr(e, "stderr", None)
+            console.print(f"[red]Error:[/red] seed {seed}: {e}")
+            if stderr:
+                console.print(stderr.decode(errors="replace").strip()[-2000:])
+            return 1
+        console.print(
+            f"[green]Generated[/green] {case_dir.relative_to(config.project_root)} "
+            f"({generator.units} units, {generator.code_model})"
+        )
+    return 0
+
+
+def fuzz_command(argv: List[str]) -> int:
+    """grader.py fuzz：FLE 工具链与本机 gcc 的差分模糊测试"""
+    parser = argparse.ArgumentParser(
+        prog="grader.py fuzz",
+        description="Differential fuzzing of cc/ld/exec against native gcc",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1, help="First program seed (default: 1)"
+    )
+    parser.add_argument(
+        "-n", "--iterations", type=int, help="Stop after this many programs"
+    )
+    parser.add_argument(
+        "-t", "--duration", type=float, help="Stop after this many seconds"
+    )
+    parser.add_argument(
+        "-J",
+        "--jobs",
+        type=int,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        help="Stop after this many failing programs (default: [fuzz].max_failures)",
+    )
+    parser.add_argument(
+        "-j", "--json", action="store_true", help="Output the report in JSON format"
+    )
+    args = parser.parse_args(argv)
+
+    # 先运行准备步骤，确保工具和 minilibc.fle 是最新的
+    grader = Grader(json_output=args.json)
+    if not grader._run_setup_steps():
+        return 1
+    console = grader.console
+    fuzzer = Fuzzer(grader.config, args.seed, args.jobs, args.max_failures)
+
+    def on_progress(stats: Dict[str, Any]) -> None:
+        console.print(
+            f"[dim]{stats['programs']} programs, {stats['failed']} failed, "
+            f"{stats['programs_per_s']} programs/s[/dim]"
+        )
+
+    report = fuzzer.run(args.iterations, args.duration, on_progress)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        console.print(
+            f"\n{report['programs']} programs in {report['elapsed_s']}s "
+            f"({report['programs_per_s']} programs/s): {report['passed']} passed, "
+            f"{report['failed']} failed, {report['invalid']} invalid"
+        )
+        for failure in report["failures"]:
+            console.print(
+                f"[red]Seed {failure['seed']}:[/red] {failure['message']}\n"
+                f"  minimized to {failure['minimized']['units']} units, "
+                f"{failure['minimized']['symbols']} symbols per unit "
+                f"({failure['attempts']} attempts): "
+                f"{failure['case_dir']}"
+            )
+    return 1 if report["failures"] else 0
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """解析 --shard 的 "i/N" 参数"""
+    match = re.fullmatch(r"(\d+)/(\d+)", value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(
+            f"invalid shard '{value}', expected I/N with 1 <= I <= N"
+        )
+    return int(match.group(1)), int(match.group(2))
+
+
+def merge_command(argv: List[str]) -> int:
+    """grader.py merge：合并各分片 --json 输出的结果"""
+    parser = argparse.ArgumentParser(
+        prog="grader.py merge",
+        description="Merge JSON results of --shard runs into one report",
+    )
+    parser.add_argument("files", nargs="+", help="JSON outputs of the shard runs")
+    parser.add_argument(
+        "-o", "--output", help="Write the merged report to a file instead of stdout"
+    )
+    args = parser.parse_args(argv)
+
+    import contextlib
+
+    reports = []
+    for file in args.files:
+        with open(file, "r", encoding="utf-8") as f:
+            # 只取第一行：--json 模式下 JSON 结果之后可能还有其他输出
+            reports.append(json.loads(f.readline()))
+
+    # 检查分片是否完整且互不重复
+    shards = [report.get("summary", {}).get("shard") for report in reports]
+    if any(shard is None for shard in shards):
+        print("Error: Input is not the output of a --shard run", file=sys.stderr)
+        return 1
+    counts = {shard["count"] for shard in shards}
+    indices = sorted(shard["index"] for shard in shards)
+    if len(counts) != 1 or indices != list(range(1, counts.pop() + 1)):
+        print(
+            f"Error: Expected shards 1..N of the same run, got {indices}",
+            file=sys.stderr,
+        )
+        return 1
+
+    # 按测试目录的原始顺序排列结果
+    entries = [
+        (name, result)
+        for report, shard in zip(reports, shards)
+        for name, result in zip(shard["tests"], report["tests"])
+    ]
+    names = [name for name, _ in entries]
+    if len(set(names)) != len(names):
+        print(
+            "Error: Shards overlap; were they split with different test histories?",
+            file=sys.stderr,
+        )
+        return 1
+    selected = [shard.get("selected") for shard in shards]
+    if any(tests != selected[0] for tests in selected):
+        print("Error: Shards were run with different test selections", file=sys.stderr)
+        return 1
+    if selected[0] is not None and set(names) != set(selected[0]):
+        missing = sorted(
+            set(selected[0]) - set(names),
+            key=lambda name: TestCaseIndex.sort_key(Path(name)),
+        )
+        extra = sorted(set(names) - set(selected[0]))
+        print(
+            f"Error: Shards do not cover the selected tests "
+            f"(missing: {', '.join(missing) or '-'}; "
+            f"unexpected: {', '.join(extra) or '-'})",
+            file=sys.stderr,
+        )
+        return 1
+    entries.sort(key=lambda entry: TestCaseIndex.sort_key(Path(entry[0])))
+    results = [result for _, result in entries]
+    total_score = sum(result["score"] for result in results)
+    max_score = sum(result["max_score"] for result in results)
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        JsonFormatter().format_results(
+            [], results, total_score, max_score, {"shards": len(reports)}
+        )
+    if args.output:
+        Path(args.output).write_text(output.getvalue(), encoding="utf-8")
+    else:
+        sys.stdout.write(output.getvalue())
+    return 0 if total_score > 0 else 1
+
+
+def stats_command(argv: List[str]) -> int:
+    """grader.py stats：测试历史记录中的耗时趋势和回归"""
+    parser = argparse.ArgumentParser(
+        prog="grader.py stats",
+        description="Show per-test and per-step runtime trends from the test "
+        "history and flag regressions",
+    )
+    parser.add_argument(
+        "-n",
+        "--window",
+        type=int,
+        help="Compare the latest run with the median of this many previous runs "
+        "(default: [stats].window)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        help="Flag a regression when the latest time is at least this many times "
+        "the previous median (default: [stats].threshold)",
+    )
+    parser.add_argument(
+        "--steps", action="store_true", help="List every step, not only regressed ones"
+    )
+    parser.add_argument(
+        "-j", "--json", action="store_true", help="Output the report in JSON format"
+    )
+    args = parser.parse_args(argv)
+    if args.window is not None and args.window < 1:
+        parser.error("--window must be at least 1")
+    if args.threshold is not None and args.threshold <= 0:
+        parser.error("--threshold must be positive")
+
+    config = Config(Path.cwd())
+    stats_config = config.stats_config
+    store = ResultStore(
+        config.project_root / ResultStore.FILE,
+        config.history_config["retention"],
+        legacy_file=config.project_root / ".test_history",
+    )
+    runs = store.runs()
+    store.close()
+    if not runs:
+        print("No test history found", file=sys.stderr)
+        return 1
+    trends = PerformanceTrends(
+        args.window if args.window is not None else int(stats_config["window"]),
+        (
+            args.threshold
+            if args.threshold is not None
+            else float(stats_config["threshold"])
+        ),
+        float(stats_config["min_delta_ms"]),
+    )
+    report = trends.analyze(runs)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        PerformanceTrends.print_report(create_console(), report, args.steps)
+    return 0
+
+
+def baseline_command(argv: List[str]) -> int:
+    """grader.py baseline：记录学生工具的耗时基线，或与基线比较"""
+    parser = argparse.ArgumentParser(
+        prog="grader.py baseline",
+        description="Record ld/nm/exec step timings as a named baseline, or "
+        "compare against one and exit non-zero on a statistically significant "
+        "slowdown",
+    )
+    parser.add_argument("action", choices=["save", "compare", "list"])
+    parser.add_argument(
+        "name",
+        nargs="?",
+        help="Baseline name (default: the current git commit for save, the most "
+        "recently saved baseline for compare)",
+    )
+    parser.add_argument(
+        "-t", "--test", help="Only measure test cases starting with this prefix"
+    )
+    parser.add_argument("-g", "--group", help="Only measure test cases in this group")
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        help="Runs per measured step (default: [baseline].repeat)",
+    )
+    parser.add_argument(
+        "--tools",
+        metavar="TOOL,TOOL,...",
+        help="Commands whose steps are measured (default: [baseline].tools)",
+    )
+    parser.add_argument(
+        "-j", "--json", action="store_true", help="Output the report in JSON format"
+    )
+    args = parser.parse_args(argv)
+
+    # 先运行准备步骤，确保计时的是最新构建的工具
+    grader = Grader(json_output=args.json)
+    console = grader.console
+    gate = ToolBaseline(
+        grader.config, args.tools.split(",") if args.tools else None, args.repeat
+    )
+    if args.action == "list":
+        for name in gate.names():
+            print(name)
+        return 0
+
+    name = args.name
+    if name is None and args.action == "save":
+        try:
+            name = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            print(
+                "Error: Not a git repository; specify a baseline name", file=sys.stderr
+            )
+            return 1
+    elif name is None:
+        names = gate.names()
+        if not names:
+            print("Error: No baseline saved yet", file=sys.stderr)
+            return 1
+        name = names[-1]
+    if not ToolBaseline.valid_name(name):
+        print(f"Error: Invalid baseline name '{name}'", file=sys.stderr)
+        return 1
+    if args.action == "compare" and not gate.path(name).exists():
+        print(f"Error: Baseline '{name}' not found", file=sys.stderr)
+        return 1
+
+    test_cases = grader._load_test_cases(args.test, False, args.group)
+    if not grader._run_setup_steps():
+        return 1
+    steps = gate.measure(test_cases, console)
+    if not steps:
+        print(
+            f"Error: No steps running {', '.join(sorted(gate.tools))} were found",
+            file=sys.stderr,
+        )
+        return 1
+
+    if args.action == "save":
+        path = gate.save(name, steps)
+        if args.json:
+            print(json.dumps({"name": name, "steps": steps}, ensure_ascii=False))
+        else:
+            console.print(
+                f"[green]Saved[/green] {len(steps)} steps × {gate.repeat} runs to "
+                f"{path.relative_to(grader.config.project_root)}"
+            )
+        return 0
+
+    report = gate.compare(
+        gate.load(name), steps, {test.path.name for test in test_cases}
+    )
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        ToolBaseline.print_report(console, report)
+    return 1 if report["regressions"] else 0
+
+
+# 使用独立参数解析器的子命令
+COMMANDS = {
+    "generate": generate_command,
+    "fuzz": fuzz_command,
+    "merge": merge_command,
+    "stats": stats_command,
+    "baseline": baseline_command,
+}
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description="Grade student submissions")
     parser.add_argument(
         "-j", "--json", action="store_true", help="Output results in JSON format"
@@ -1848,43 +6785,157 @@ def main():
         action="store_true",
         help="Overwrite existing VS Code configurations instead of merging",
     )
+    parser.add_argument(
+        "-J",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="N",
+        help="Run up to N test cases in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--step-jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Run up to N independent steps of a test case in parallel",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse cached results of compile steps whose inputs are unchanged",
+    )
+    parser.add_argument(
+        "--changed",
+        action="store_true",
+        help="Only run test cases whose inputs changed since they last passed",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Stay resident, rebuild when sources change and re-run only the "
+        "affected groups",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="Only run shard I of N (1-based); shards are balanced by test "
+        "durations recorded in .test_results.db",
+    )
+    parser.add_argument(
+        "--order",
+        choices=["canonical", "lpt", "failed-first", "recent-change"],
+        default="canonical",
+        help="Order in which test cases are executed: slowest first (lpt), last "
+        "failed first, or changed inputs first; results are always reported in "
+        "canonical order",
+    )
+    parser.add_argument(
+        "--usage",
+        action="store_true",
+        help="Show per-test CPU time and peak memory columns in the result table",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["subprocess", "asyncio"],
+        default="subprocess",
+        help="Process execution engine for test steps (default: subprocess)",
+    )
+    parser.add_argument(
+        "--max-procs",
+        type=int,
+        metavar="N",
+        help="Maximum number of step processes in flight with the asyncio engine "
+        "(default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--self-bench",
+        action="store_true",
+        help="Benchmark the grader itself (startup time and per-phase harness "
+        "overhead on a synthetic test tree) and print JSON; exits non-zero when "
+        "startup is over budget",
+    )
+    parser.add_argument(
+        "--bench-runs",
+        type=int,
+        metavar="N",
+        help="Number of samples per --self-bench measurement "
+        "(default: [bench].runs in grader_config.toml)",
+    )
+    parser.add_argument(
+        "--bench-cases",
+        type=int,
+        metavar="N",
+        help="Number of synthetic test cases generated by --self-bench "
+        "(default: [bench].cases)",
+    )
+    parser.add_argument(
+        "--bench-steps",
+        type=int,
+        metavar="N",
+        help="Number of steps per synthetic test case (default: [bench].steps)",
+    )
+    parser.add_argument(
+        "--bench-linker",
+        action="store_true",
+        help="Benchmark ld and nm on generated FLE workloads of increasing size "
+        "and report throughput and fitted scaling exponents",
+    )
+    parser.add_argument(
+        "--bench-sizes",
+        metavar="N,N,...",
+        help="Comma-separated symbol counts for --bench-linker "
+        "(default: [bench].linker_sizes)",
+    )
     parser.add_argument("test", nargs="?", help="Specific test to run")
     args = parser.parse_args()
 
     try:
+        # 评分器自身的性能基准
+        if args.self_bench:
+            benchmark = SelfBenchmark(
+                Config(Path.cwd()), args.bench_runs, args.bench_cases, args.bench_steps
+            )
+            report = benchmark.run()
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            sys.exit(0 if benchmark.passed(report) else 1)
+
+        # 学生链接器的吞吐量基准：先运行准备步骤以构建工具
+        if args.bench_linker:
+            grader = Grader(json_output=args.json)
+            if not grader._run_setup_steps():
+                sys.exit(1)
+            benchmark = LinkerBenchmark(
+                grader.config,
+                [int(size) for size in args.bench_sizes.split(",")]
+                if args.bench_sizes
+                else None,
+                args.bench_runs,
+            )
+            report = benchmark.run()
+            if args.json:
+                print(json.dumps(report, ensure_ascii=False, indent=2))
+            else:
+                LinkerBenchmark.print_report(grader.console, report)
+            sys.exit(0)
+
         # 如果是获取上次失败测试点的模式
         if args.get_last_failed:
             try:
-                history_file = Path(".test_history")
-                if not history_file.exists():
-                    print("No test history found", file=sys.stderr)
-                    sys.exit(1)
-
-                with open(history_file, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-                    if not history:
-                        print("Test history is empty", file=sys.stderr)
-                        sys.exit(1)
-
-                    # 获取最近一次的测试结果
-                    last_result = history[-1]
-
-                    # 查找第一个失败的测试点
-                    for test in last_result["tests"]:
-                        if test["status"] != "PASS":
-                            # 获取shell类型
-                            shell_type = args.shell or get_current_shell()
-
-                            # 根据不同shell类型生成相应的命令
-                            if shell_type == "fish":
-                                print(f"set -x TEST_BUILD {test['build_path']}")
-                            else:  # bash 或 zsh
-                                print(f"export TEST_BUILD={test['build_path']}")
-                            sys.exit(0)
-
+                failed = last_failed_tests()
+                if not failed:
                     print("No failed test found in last run", file=sys.stderr)
                     sys.exit(1)
 
+                # 根据不同shell类型生成相应的命令
+                shell_type = args.shell or get_current_shell()
+                if shell_type == "fish":
+                    print(f"set -x TEST_BUILD {failed[0]['build_path']}")
+                else:  # bash 或 zsh
+                    print(f"export TEST_BUILD={failed[0]['build_path']}")
+                sys.exit(0)
+
             except Exception as e:
                 print(f"Error reading test history: {str(e)}", file=sys.stderr)
                 sys.exit(1)
@@ -1892,82 +6943,73 @@ def main():
         # 如果是重新运行失败测试点的模式
         if args.rerun_failed:
             try:
-                history_file = Path(".test_history")
-                if not history_file.exists():
-                    print("No test history found", file=sys.stderr)
-                    sys.exit(1)
-
-                with open(history_file, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-                    if not history:
-                        print("Test history is empty", file=sys.stderr)
-                        sys.exit(1)
-
-                    # 获取最近一次的测试结果
-                    last_result = history[-1]
-
-                    # 获取所有失败的测试点路径
-                    failed_paths = []
-                    for test in last_result["tests"]:
-                        if test["status"] != "PASS":
-                            failed_paths.append(Path(test["path"]))
-
-                    if not failed_paths:
-                        print("No failed test found in last run", file=sys.stderr)
-                        sys.exit(0)
-
-                    # 直接传入失败测试点的路径
-                    grader = Grader(json_output=args.json)
-                    grader.runner = TestRunner(
-                        grader.config, grader.console, verbose=args.verbose
-                    )
-                    grader.run_all_tests(specific_paths=failed_paths)
-
-                    # 检查是否所有测试都通过
-                    total_score = sum(
-                        result.score for result in grader.results.values()
-                    )
-                    max_score = sum(
-                        test.meta["score"]
-                        for test in grader._load_test_cases(specific_paths=failed_paths)
-                    )
-                    percentage = (total_score / max_score * 100) if max_score > 0 else 0
+                # 获取最近一次运行中所有失败的测试点路径
+                failed_paths = [Path(test["path"]) for test in last_failed_tests()]
 
-                    # 如果需要写入结果文件
-                    if args.write_result:
-                        with open(".autograder_result", "w") as f:
-                            f.write(f"{percentage:.2f}")
-
-                    # 只要有测试点失败，输出提示信息
-                    if total_score < max_score:
-                        if not args.json:
-                            console = Console()
-                            shell_type = args.shell or get_current_shell()
+                if not failed_paths:
+                    print("No failed test found in last run", file=sys.stderr)
+                    sys.exit(0)
+
+                # 直接传入失败测试点的路径
+                grader = Grader(
+                    json_output=args.json,
+                    jobs=args.jobs,
+                    use_cache=args.cache,
+                    engine=args.engine,
+                    max_procs=args.max_procs,
+                    show_usage=args.usage,
+                    order=args.order,
+                )
+                grader.runner = TestRunner(
+                    grader.config,
+                    grader.console,
+                    verbose=args.verbose,
+                    step_jobs=args.step_jobs,
+                    cache=grader.cache,
+                    executor=grader.executor,
+                )
+                grader.run_all_tests(specific_paths=failed_paths)
+
+                # 检查是否所有测试都通过
+                total_score = sum(result.score for result in grader.results.values())
+                max_score = sum(test.meta["score"] for test in grader.test_cases)
+                percentage = (total_score / max_score * 100) if max_score > 0 else 0
+
+                # 如果需要写入结果文件
+                if args.write_result:
+                    with open(".autograder_result", "w") as f:
+                        f.write(f"{percentage:.2f}")
+
+                # 只要有测试点失败，输出提示信息
+                if total_score < max_score:
+                    if not args.json:
+                        console = create_console()
+                        shell_type = args.shell or get_current_shell()
+
+                        console.print(
+                            "\n[bold yellow]To set TEST_BUILD environment variable to the failed test case's build directory:[/bold yellow]"
+                        )
 
+                        if shell_type == "fish":
                             console.print(
-                                "\n[bold yellow]To set TEST_BUILD environment variable to the failed test case's build directory:[/bold yellow]"
+                                "$ [bold green]python3 grader.py -l | source[/bold green]"
                             )
-
-                            if shell_type == "fish":
-                                console.print(
-                                    "$ [bold green]python3 grader.py -l | source[/bold green]"
-                                )
-                            else:
-                                console.print(
-                                    '$ [bold green]eval "$(python3 grader.py -l)"[/bold green]'
-                                )
                         else:
-                            shell_type = args.shell or get_current_shell()
-                            print(
-                                "\nTo set TEST_BUILD to the first failed test case's build directory, run:"
+                            console.print(
+                                '$ [bold green]eval "$(python3 grader.py -l)"[/bold green]'
                             )
-                            if shell_type == "fish":
-                                print("python3 grader.py -l | source")
-                            else:
-                                print('eval "$(python3 grader.py -l)"')
+                    else:
+                        shell_type = args.shell or get_current_shell()
+                        print(
+                            "\nTo set TEST_BUILD to the first failed test case's build directory, run:"
+                        )
+                        if shell_type == "fish":
+                            print("python3 grader.py -l | source")
+                        else:
+                            print('eval "$(python3 grader.py -l)"')
 
-                    # 只要不是0分就通过
-                    sys.exit(0 if percentage > 0 else 1)
+                # 只要不是0分就通过
+                sys.exit(0 if percentage > 0 else 1)
 
             except Exception as e:
                 print(f"Error reading test history: {str(e)}", file=sys.stderr)
@@ -1988,7 +7030,21 @@ def main():
             verbose=args.verbose,
             generate_vscode=args.vscode,
             vscode_no_merge=args.vscode_no_merge,
+            jobs=args.jobs,
+            step_jobs=args.step_jobs,
+            use_cache=args.cache,
+            changed_only=args.changed,
+            engine=args.engine,
+            max_procs=args.max_procs,
+            show_usage=args.usage,
+            shard=args.shard,
+            order=args.order,
         )
+        if args.watch:
+            WatchSession(
+                grader, args.test, prefix_match=args.prefix, group=args.group
+            ).run()
+            sys.exit(0)
         total_score, max_score = grader.run_all_tests(
             args.test, prefix_match=args.prefix, group=args.group
         )
@@ -2007,7 +7063,7 @@ def main():
         # 如果有测试点失败，输出提示信息
         if total_score < max_score:
             if not args.json:
-                console = Console()
+                console = create_console()
                 shell_type = args.shell or get_current_shell()
 
                 console.print(
@@ -0,0 +1,78 @@
+"""grader.py 的单元测试（python -m pytest tests）"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import grader  # noqa: E402
+
+
+def make_runner() -> grader.TestRunner:
+    return grader.TestRunner(grader.Config(ROOT), show_progress=False)
+
+
+def test_step_running_a_build_output_depends_on_its_producer():
+    steps = [
+        {
+            "name": "Link program",
+            "command": "${root_dir}/ld",
+            "args": ["${build_dir}/main.fle", "-o", "${build_dir}/program"],
+        },
+        {
+            "name": "Prepare input",
+            "command": "cp",
+            "args": ["${test_dir}/input.txt", "-o", "${build_dir}/input.txt"],
+        },
+        {
+            "name": "Run program",
+            "command": "${build_dir}/program",
+            "args": ["${build_dir}/input.txt"],
+        },
+    ]
+    test = grader.TestCase(
+        path=ROOT, meta={"name": "graph", "score": 1}, run_steps=steps
+    )
+    deps = make_runner()._build_step_graph(test)
+    assert deps[1] == set()
+    assert deps[2] == {0, 1}
+
+
+def test_result_store_round_trips_output_only_error_details(tmp_path):
+    store = grader.ResultStore(tmp_path / "results.db")
+    test = {
+        "path": "tests/cases/1-nm-test",
+        "name": "nm",
+        "status": "FAIL",
+        "score": 0,
+        "max_score": 10,
+        "time": 0.5,
+        "error_details": {"stdout": "out\n", "stderr": "err\n"},
+    }
+    store.record_run(
+        {
+            "timestamp": "2026-01-01T00:00:00",
+            "total_score": 0,
+            "max_score": 10,
+            "percentage": 0.0,
+            "tests": [test],
+        }
+    )
+    (loaded,) = store.runs(with_outputs=True)[0]["tests"]
+    store.close()
+    assert loaded["error_details"] == {"stdout": "out\n", "stderr": "err\n"}
+
+
+def test_file_digest_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(grader, "_file_digests", grader.OrderedDict())
+    monkeypatch.setattr(grader, "FILE_DIGEST_CACHE_SIZE", 2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(str(i))
+        paths.append(path)
+        grader.file_digest(path)
+    path.write_text("changed")
+    grader.file_digest(path)
+    assert list(grader._file_digests) == [(str(p), "bytes") for p in paths[1:]]